@@ -3,14 +3,24 @@
 This module retrieves bus stop data for a specific route and direction from the Taipei eBus website,
 saves the rendered HTML and CSV file, and stores the parsed data in a SQLite database.
 """
+import argparse
 import json
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 from playwright.sync_api import sync_playwright
 from sqlalchemy import create_engine, Column, String, Float, Integer, Boolean
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+from cycu11372010.route_shapes import RouteShapeStore
+from cycu11372010.snapshot_cache import SnapshotCache
+
+
+WKT_PAYLOAD_PATTERN = re.compile(r'JSON\.stringify\s*\(\s*(\{[\s\S]*?\})\s*\)')
+
 
 class taipei_route_info:
     """
@@ -36,9 +46,18 @@ class taipei_route_info:
         # Save the rendered HTML to a file for inspection
         self.html_file = f"{self.working_directory}/ebus_taipei_{self.route_id}.html"
 
+        # Prefer the snapshot cache written by cycu11372010.ebus_taipei; the WKT payload is
+        # the same on every direction, so any snapshot of the page will do
+        cache = SnapshotCache(f"{self.working_directory}/snapshots", ttl_seconds=None)
+        for cached_direction in ['go', 'both', 'come']:
+            self.content = cache.get(self.url, cached_direction)
+            if self.content is not None:
+                break
+
         #read self.content from the self.html_file
-        with open(self.html_file, 'r', encoding='utf-8') as file:
-            self.content = file.read()
+        if self.content is None:
+            with open(self.html_file, 'r', encoding='utf-8') as file:
+                self.content = file.read()
 
     def parse_wkt_fields(self) -> dict:
         """
@@ -49,8 +68,7 @@ class taipei_route_info:
         """
 
         wkt_dict = {}
-        pattern = r'JSON\.stringify\s*\(\s*(\{[\s\S]*?\})\s*\)'
-        match = re.search(pattern, self.content)
+        match = WKT_PAYLOAD_PATTERN.search(self.content)
         if match:
             json_text = match.group(1)
             
@@ -117,39 +135,78 @@ class taipei_route_list:
 
 
 
+def extract_route_wkt(route: tuple) -> tuple:
+    """
+    Reads the WKT fields of one route; module level so a process pool can run it.
+
+    Args:
+        route (tuple): (route_id, route_name, working_directory)
+
+    Returns:
+        tuple: (route_id, route_name, list of (wkt_id, wkt_string), error message or None)
+    """
+    route_id, route_name, working_directory = route
+    try:
+        route_info = taipei_route_info(route_id=route_id, direction="go", working_directory=working_directory)
+        return route_id, route_name, list(route_info.parse_wkt_fields().items()), None
+    except Exception as e:
+        return route_id, route_name, [], str(e)
+
+
+def collect_route_wkt(routes: pd.DataFrame, working_directory: str = 'data', processes: int = None) -> pd.DataFrame:
+    """
+    Extracts the WKT strings of every route into one table, without building geometries.
+
+    Args:
+        routes (pd.DataFrame): Routes with route_id and route_name columns.
+        working_directory (str): Directory holding the snapshots and HTML files.
+        processes (int): Worker processes reading the pages; None or 1 reads them in this process.
+
+    Returns:
+        pd.DataFrame: wkt_id, wkt_string, route_id and route_name, one row per WKT field.
+    """
+    tasks = [(route_id, route_name, working_directory)
+             for route_id, route_name in zip(routes["route_id"], routes["route_name"])]
+    if processes and processes > 1:
+        with ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(extract_route_wkt, tasks, chunksize=16))
+    else:
+        results = [extract_route_wkt(task) for task in tasks]
+
+    rows = []
+    for route_id, route_name, wkt_fields, error in results:
+        if error is not None:
+            print(f"Error processing route {route_name}: {error}")
+            continue
+        print(f"Route ID: {route_id}", len(wkt_fields))
+        rows.extend((wkt_id, wkt_string, route_id, route_name) for wkt_id, wkt_string in wkt_fields)
+    return pd.DataFrame(rows, columns=['wkt_id', 'wkt_string', 'route_id', 'route_name'])
+
+
+def build_route_geodataframe(wkt_df: pd.DataFrame):
+    """
+    Converts every WKT string with a single vectorized from_wkt call.
+
+    Returns:
+        gpd.GeoDataFrame: wkt_df with a WGS84 geometry column.
+    """
+    import geopandas as gpd
+
+    return gpd.GeoDataFrame(wkt_df, geometry=gpd.GeoSeries.from_wkt(wkt_df['wkt_string']), crs='EPSG:4326')
+
+
 if __name__ == "__main__":
-    # Initialize and process route data
-    route_list = taipei_route_list()
-    #define a empty geodataframe for gathering all the following df 
-    geo_df = pd.DataFrame()    
-
-    for _, row in route_list.read_from_database().iterrows():
-        try:
-            route_info = taipei_route_info(route_id=row["route_id"], direction="go")
-            dict_wkt = route_info.parse_wkt_fields()
-
-            # Save the parsed data to a CSV file
-            df = pd.DataFrame(dict_wkt.items(), columns=['wkt_id', 'wkt_string'])
-            df['route_id'] = route_info.route_id
-            df['route_name'] = row["route_name"]
-
-            #convert df to geodataframe
-            import geopandas as gpd
-            df['geometry'] = gpd.GeoSeries.from_wkt(df['wkt_string'])
-            df = gpd.GeoDataFrame(df, geometry='geometry')
- 
-            # Set the coordinate reference system (CRS) to WGS84
-            df.crs = 'EPSG:4326'
-            # Set the geometry column
-            df.set_geometry('geometry', inplace=True)
-
-
-            # Append the new data to the existing GeoDataFrame
-            geo_df = pd.concat([geo_df, df], ignore_index=True)
-            print(f"Route ID: {route_info.route_id}", len(dict_wkt))            
-            print(f"Processing route {df}...")
-        except Exception as e:
-            print(f"Error processing route {row['route_name']}: {e}")
+    parser = argparse.ArgumentParser(description='Extract the route shapes of every route into a GeoPackage.')
+    parser.add_argument('--working-directory', default='data')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    route_list = taipei_route_list(working_directory=args.working_directory)
+    wkt_df = collect_route_wkt(route_list.read_from_database(), args.working_directory, args.processes)
+    geo_df = build_route_geodataframe(wkt_df)
+
+    # Keep the shapes as WKB with an R-tree in the SQLite database for fast reloading
+    RouteShapeStore(args.working_directory).save_shapes(wkt_df)
 
     # Save the combined GeoDataFrame to a GeoPackage
-    geo_df.to_file(f"{route_list.working_directory}/ebus_taipei_routes.gpkg", layer='data_routes_wkt', driver='GPKG')
\ No newline at end of file
+    geo_df.to_file(f"{route_list.working_directory}/ebus_taipei_routes.gpkg", layer='data_routes_wkt', driver='GPKG')
@@ -1,6 +1,7 @@
 import asyncio
 from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
+from cycu11372010.request_filter import RequestFilter
 import geopandas as gpd
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
@@ -12,6 +13,9 @@ from shapely.geometry import Point
 from PIL import Image, ImageDraw
 from math import radians, cos, sin, sqrt, atan2
 
+# 只需要站牌 HTML，圖片、字型、樣式、地圖圖磚與追蹤碼都擋掉
+REQUEST_FILTER = RequestFilter()
+
 def haversine(lat1, lon1, lat2, lon2):
     R = 6371
     dlat = radians(lat2 - lat1)
@@ -25,6 +29,7 @@ async def fetch_bus_stations(route_id: str, output_dir: str, direction: str):
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         page = await browser.new_page()
+        await REQUEST_FILTER.install_async(page)
         await page.goto(url)
 
         try:
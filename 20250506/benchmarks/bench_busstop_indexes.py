@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# 比較 data_route_info_busstop 建立查詢索引前後的查詢延遲
+# 用法: python 20250506/benchmarks/bench_busstop_indexes.py [--working-directory data] [--routes 1000]
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from cycu11372010.ebus_taipei import STOP_RTREE, get_engine
+
+
+# 加索引之前的資料表（只有主鍵）
+BASE_TABLE_SQL = '''
+CREATE TABLE data_route_info_busstop (
+    stop_id INTEGER, arrival_info VARCHAR, eta_seconds INTEGER, arrival_status INTEGER,
+    stop_number INTEGER NOT NULL, stop_name VARCHAR, latitude FLOAT, longitude FLOAT,
+    direction VARCHAR NOT NULL, route_id VARCHAR NOT NULL,
+    PRIMARY KEY (stop_number, direction, route_id)
+)
+'''
+
+QUERIES = {
+    'by route': ('SELECT * FROM data_route_info_busstop WHERE route_id = ? AND direction = ? ORDER BY stop_number',
+                 lambda sample: (sample['route_id'], sample['direction'])),
+    'by stop_id': ('SELECT * FROM data_route_info_busstop WHERE stop_id = ?',
+                   lambda sample: (sample['stop_id'],)),
+    'by stop_name': ('SELECT * FROM data_route_info_busstop WHERE stop_name = ?',
+                     lambda sample: (sample['stop_name'],)),
+    'bounding box': ('SELECT * FROM data_route_info_busstop '
+                     'WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?',
+                     lambda sample: (sample['latitude'] - 0.003, sample['latitude'] + 0.003,
+                                     sample['longitude'] - 0.003, sample['longitude'] + 0.003)),
+}
+
+# 加索引之後改寫的查詢：範圍查詢走 R-tree（和 stops_in_bbox 相同），參數不變
+INDEXED_SQL = {
+    'bounding box': f'SELECT s.* FROM {STOP_RTREE} r JOIN data_route_info_busstop s ON s.rowid = r.stop_rowid '
+                    'WHERE r.max_lat >= ?1 AND r.min_lat <= ?2 AND r.max_lon >= ?3 AND r.min_lon <= ?4 '
+                    'AND s.latitude BETWEEN ?1 AND ?2 AND s.longitude BETWEEN ?3 AND ?4',
+}
+
+
+def build_city_table(source_db: str, target_db: str, routes: int) -> int:
+    """
+    把現有的站牌複製成約 routes 條路線的城市規模資料表，每份複本換 route_id、stop_id 並稍微平移座標
+
+    Returns:
+        int: 資料筆數
+    """
+    source = sqlite3.connect(source_db)
+    rows = source.execute(
+        'SELECT stop_id, arrival_info, stop_number, stop_name, latitude, longitude, direction, route_id '
+        'FROM data_route_info_busstop').fetchall()
+    source_routes = len({row[7] for row in rows})
+    source.close()
+
+    target = sqlite3.connect(target_db)
+    target.execute(BASE_TABLE_SQL)
+    copies = max(1, routes // max(source_routes, 1))
+    for copy in range(copies):
+        offset = (copy % 10) * 0.01
+        target.executemany(
+            'INSERT INTO data_route_info_busstop (stop_id, arrival_info, stop_number, stop_name, latitude, longitude, '
+            'direction, route_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(stop_id + copy * 1000000, arrival, number, f'{name}#{copy // 5}', lat + offset, lon + offset,
+              direction, f'{route_id}_{copy:03d}')
+             for stop_id, arrival, number, name, lat, lon, direction, route_id in rows])
+    target.commit()
+    count = target.execute('SELECT COUNT(*) FROM data_route_info_busstop').fetchone()[0]
+    target.close()
+    return count
+
+
+def measure(db_path: str, samples: list, indexed: bool = False) -> dict:
+    """
+    Args:
+        indexed (bool): 用 INDEXED_SQL 改寫過的查詢
+
+    Returns:
+        dict: 每種查詢的 (延遲中位數毫秒, 查詢計畫)
+    """
+    connection = sqlite3.connect(db_path)
+    results = {}
+    for label, (sql, params) in QUERIES.items():
+        if indexed:
+            sql = INDEXED_SQL.get(label, sql)
+        plan = ' / '.join(row[3] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql, params(samples[0])))
+        timings = []
+        for sample in samples:
+            start = time.perf_counter()
+            connection.execute(sql, params(sample)).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[label] = (statistics.median(timings), plan)
+    connection.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--working-directory', default='data')
+    parser.add_argument('--routes', type=int, default=1000)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, 'hermes_ebus_taipei.sqlite3')
+        count = build_city_table(os.path.join(args.working_directory, 'hermes_ebus_taipei.sqlite3'), db_path,
+                                 args.routes)
+
+        connection = sqlite3.connect(db_path)
+        columns = ['route_id', 'direction', 'stop_id', 'stop_name', 'latitude', 'longitude']
+        rows = connection.execute(f'SELECT {", ".join(columns)} FROM data_route_info_busstop').fetchall()
+        connection.close()
+        samples = [dict(zip(columns, row)) for row in random.Random(0).sample(rows, min(args.samples, len(rows)))]
+        print(f"{count} stop rows")
+
+        before = measure(db_path, samples)
+
+        # 由 get_engine 依 ORM 定義補上索引與 R-tree，和既有資料庫升級時走同一條路
+        start = time.perf_counter()
+        get_engine(directory).dispose()
+        print(f"creating indexes: {(time.perf_counter() - start) * 1000:.0f} ms")
+        after = measure(db_path, samples, indexed=True)
+
+        for label in QUERIES:
+            (before_ms, before_plan), (after_ms, after_plan) = before[label], after[label]
+            print(f"\n{label:<13} {before_ms:8.3f} ms -> {after_ms:8.3f} ms  ({before_ms / after_ms:.0f}x)")
+            print(f"  before: {before_plan}")
+            print(f"  after:  {after_plan}")
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# 比較站牌解析的 STOP_PATTERN 正規表示式與單次掃描的 HTML parser
+# 用法: python 20250506/benchmarks/bench_stop_parser.py [--working-directory data] [--repeat 20]
+import argparse
+import glob
+import gzip
+import os
+import sqlite3
+import statistics
+import time
+
+from cycu11372010.ebus_taipei import STOP_PATTERN, _direction_sections
+from cycu11372010.stop_parser import parse_stops, stops_for_direction
+
+
+STATION_LI = '''<li>
+<a class="auto-list-link auto-list-stationlist-link" href="javascript:void(0);">
+<span class="auto-list auto-list-stationlist">
+<span class="auto-list-stationlist-position auto-list-stationlist-position-none">{arrival}</span>
+<span class="auto-list-stationlist-number"> {number}</span>
+<span class="auto-list-stationlist-place">{name}</span>
+<input id="item_UniStopId" name="item.UniStopId" type="hidden" value="{stop_id}" />
+<input data-val="true" id="item_Latitude" name="item.Latitude" type="hidden" value="{lat}" />
+<input data-val="true" id="item_Longitude" name="item.Longitude" type="hidden" value="{lon}" />
+</span>
+</a>
+</li>
+'''
+
+# 同樣的 input，只是 value 寫在 name 前面
+REORDERED_LI = STATION_LI.replace(
+    '<input id="item_UniStopId" name="item.UniStopId" type="hidden" value="{stop_id}" />',
+    '<input value="{stop_id}" id="item_UniStopId" type="hidden" name="item.UniStopId" />',
+)
+
+MENU = '<div class="nav"><ul>' + '<li><a href="#">menu</a></li>' * 40 + '</ul></div>\n'
+
+
+def synthetic_pages(db_path: str, limit: int, template: str = STATION_LI, padding: int = 0) -> dict:
+    """
+    由資料庫中的站牌組出與 StopsOfRoute 相同結構的頁面
+    """
+    connection = sqlite3.connect(db_path)
+    route_ids = [r[0] for r in connection.execute(
+        'SELECT DISTINCT route_id FROM data_route_info_busstop ORDER BY route_id LIMIT ?', (limit,))]
+    pages = {}
+    for route_id in route_ids:
+        parts = ['<html><body>', MENU * padding]
+        for div_id, direction in (('GoDirectionRoute', 'go'), ('BackDirectionRoute', 'come')):
+            parts.append(f'<div id="{div_id}"><ul>')
+            for row in connection.execute(
+                    'SELECT arrival_info, stop_number, stop_name, stop_id, latitude, longitude '
+                    'FROM data_route_info_busstop WHERE route_id = ? AND direction = ? ORDER BY stop_number',
+                    (route_id, direction)):
+                arrival, number, name, stop_id, lat, lon = row
+                parts.append(template.format(arrival=arrival or '', number=number, name=name,
+                                             stop_id=stop_id, lat=lat, lon=lon))
+            parts.append('</ul></div>')
+        parts.append('</body></html>')
+        pages[route_id] = '\n'.join(parts)
+    connection.close()
+    return pages
+
+
+def captured_pages(snapshot_directory: str, limit: int) -> dict:
+    """
+    讀取快照快取中實際抓到的頁面
+    """
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(snapshot_directory, 'blobs', '*', '*.html.gz')))[:limit]:
+        with gzip.open(path, 'rb') as file:
+            pages[os.path.basename(path)[:12]] = file.read().decode('utf-8')
+    return pages
+
+
+def regex_both(content: str) -> dict:
+    sections = _direction_sections(content)
+    return {d: STOP_PATTERN.findall(sections.get(d, content)) for d in ('go', 'come')}
+
+
+def parser_both(content: str, backend: str) -> dict:
+    stops = parse_stops(content, backend)
+    return {d: stops_for_direction(stops, d) for d in ('go', 'come')}
+
+
+def time_per_page(function, pages: dict, repeat: int) -> float:
+    """
+    Returns:
+        float: 每頁解析時間的中位數（毫秒）
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for content in pages.values():
+            function(content)
+        samples.append((time.perf_counter() - start) * 1000 / len(pages))
+    return statistics.median(samples)
+
+
+def run(name: str, pages: dict, backends: list, repeat: int, include_regex: bool = True):
+    if not pages:
+        print(f"{name}: no pages")
+        return
+    size_kb = statistics.mean(len(p) for p in pages.values()) / 1024
+    print(f"\n{name}: {len(pages)} pages, {size_kb:.0f} KB average")
+
+    reference = {route_id: parser_both(content, 'html.parser') for route_id, content in pages.items()}
+    candidates = {'regex': regex_both} if include_regex else {}
+    candidates.update({backend: (lambda content, b=backend: parser_both(content, b)) for backend in backends})
+
+    for label, function in candidates.items():
+        results = {route_id: function(content) for route_id, content in pages.items()}
+        stops = sum(len(r['go']) + len(r['come']) for r in results.values())
+        expected = sum(len(r['go']) + len(r['come']) for r in reference.values())
+        identical = sum(results[route_id] == reference[route_id] for route_id in pages)
+        ms = time_per_page(function, pages, repeat)
+        print(f"  {label:<12} {ms:8.3f} ms/page  stops {stops}/{expected}  identical pages {identical}/{len(pages)}")
+
+
+def regex_scaling(pages: dict, station_counts=(2, 4, 6, 8, 10)):
+    """
+    正規表示式在 input 屬性順序不同時會大量回溯，只取前幾站量測成長趨勢（整頁會跑不完）
+    """
+    content = next(iter(pages.values()))
+    stations = _direction_sections(content)['go'].split('<li>')
+    print("\n  regex on the first N reordered stations (full pages do not finish):")
+    for count in station_counts:
+        section = '<li>'.join(stations[:count + 1])
+        start = time.perf_counter()
+        found = len(STOP_PATTERN.findall(section))
+        print(f"  N={count:<3} {(time.perf_counter() - start) * 1000:10.1f} ms  stops {found}/{count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--working-directory', default='data')
+    parser.add_argument('--routes', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    backends = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        backends.append('lxml')
+    except ImportError:
+        print("lxml not installed, benchmarking html.parser only")
+
+    db_path = os.path.join(args.working_directory, 'hermes_ebus_taipei.sqlite3')
+    run('captured snapshots', captured_pages(os.path.join(args.working_directory, 'snapshots'), args.routes),
+        backends, args.repeat)
+    run('synthetic pages', synthetic_pages(db_path, args.routes), backends, args.repeat)
+    run('synthetic pages with large menus', synthetic_pages(db_path, args.routes, padding=20), backends, args.repeat)
+    reordered = synthetic_pages(db_path, args.routes, template=REORDERED_LI)
+    run('reordered input attributes', reordered, backends, args.repeat, include_regex=False)
+    regex_scaling(reordered)
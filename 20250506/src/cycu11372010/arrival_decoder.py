@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+This module decodes the free-text arrival_info of the eBus site ("7分鐘", "進站中",
+"預計20:30發車", ...) into a numeric ETA and a small status code.
+"""
+
+from datetime import datetime
+
+import pandas as pd
+
+
+ARRIVAL_UNKNOWN = 0       # empty: the site only fills the visible direction
+ARRIVAL_MINUTES = 1       # "N分鐘"
+ARRIVAL_ARRIVING = 2      # "進站中"
+ARRIVAL_APPROACHING = 3   # "將到站"
+ARRIVAL_SCHEDULED = 4     # "預計HH:MM發車"
+ARRIVAL_NOT_DEPARTED = 5  # "尚未發車"
+ARRIVAL_LAST_PASSED = 6   # "末班已過"
+ARRIVAL_NO_SERVICE = 7    # "今日未營運", "交管不停靠", ...
+ARRIVAL_OTHER = 9         # any other text
+
+# Texts with a fixed meaning: (status, eta_seconds or None)
+FIXED_ARRIVALS = {
+    '進站中': (ARRIVAL_ARRIVING, 0),
+    '將到站': (ARRIVAL_APPROACHING, 60),
+    '尚未發車': (ARRIVAL_NOT_DEPARTED, None),
+    '末班已過': (ARRIVAL_LAST_PASSED, None),
+    '末班駛離': (ARRIVAL_LAST_PASSED, None),
+    '今日未營運': (ARRIVAL_NO_SERVICE, None),
+    '今日停駛': (ARRIVAL_NO_SERVICE, None),
+    '交管不停靠': (ARRIVAL_NO_SERVICE, None),
+    '不停靠': (ARRIVAL_NO_SERVICE, None),
+}
+
+MINUTES_PATTERN = r'^(\d+)\s*分鐘?$'
+SCHEDULED_PATTERN = r'^預計\s*(\d{1,2}):(\d{2})\s*發車$'
+
+
+def decode_arrival_info(arrival_info: pd.Series, now: datetime = None) -> pd.DataFrame:
+    """
+    Decodes a column of arrival texts without a Python-level loop.
+
+    Scheduled departures ("預計20:30發車") get the seconds from now until that time;
+    a time more than 12 hours in the past is taken as tomorrow, a slightly late one as 0.
+
+    Args:
+        arrival_info (pd.Series): arrival_info texts.
+        now (datetime): Reference time for scheduled departures; defaults to now.
+
+    Returns:
+        pd.DataFrame: eta_seconds (nullable Int32, missing when no bus is expected) and
+            arrival_status (int8, one of the ARRIVAL_* codes), on the same index.
+    """
+    now = now or datetime.now()
+    text = arrival_info.astype(object).where(arrival_info.notna(), '').astype(str).str.strip()
+
+    status = pd.Series(ARRIVAL_OTHER, index=text.index, dtype='int8')
+    eta = pd.Series(pd.NA, index=text.index, dtype='Int32')
+
+    status[text == ''] = ARRIVAL_UNKNOWN
+
+    minutes = text.str.extract(MINUTES_PATTERN)[0]
+    has_minutes = minutes.notna()
+    status[has_minutes] = ARRIVAL_MINUTES
+    eta[has_minutes] = minutes[has_minutes].astype(int) * 60
+
+    scheduled = text.str.extract(SCHEDULED_PATTERN)
+    is_scheduled = scheduled[0].notna()
+    if is_scheduled.any():
+        departure = scheduled.loc[is_scheduled, 0].astype(int) * 3600 + scheduled.loc[is_scheduled, 1].astype(int) * 60
+        delta = departure - (now.hour * 3600 + now.minute * 60 + now.second)
+        delta[delta < -12 * 3600] += 24 * 3600
+        status[is_scheduled] = ARRIVAL_SCHEDULED
+        eta[is_scheduled] = delta.clip(lower=0)
+
+    fixed = text.map(FIXED_ARRIVALS)
+    is_fixed = fixed.notna()
+    if is_fixed.any():
+        status[is_fixed] = fixed[is_fixed].str[0].astype('int8')
+        eta[is_fixed] = fixed[is_fixed].str[1].astype('Int32')
+
+    return pd.DataFrame({"eta_seconds": eta, "arrival_status": status})
+
+
+def bus_expected(arrival_status: pd.Series) -> pd.Series:
+    """
+    Returns:
+        pd.Series: True where a bus is on its way (minutes, arriving, approaching or scheduled).
+    """
+    return arrival_status.isin([ARRIVAL_MINUTES, ARRIVAL_ARRIVING, ARRIVAL_APPROACHING, ARRIVAL_SCHEDULED])
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps the history of decoded arrivals (eta_seconds and arrival_status)
+that each crawl overwrites in data_route_info_busstop, in compact append-only
+files rolled per day and per route.
+"""
+
+import os
+import struct
+import zlib
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from dateutil.tz import tzlocal
+
+from cycu11372010.ebus_taipei import DIRECTION_DTYPE
+
+
+# Block layout before compression: header, then one array per column
+BLOCK_HEADER = struct.Struct('<qI')  # snapshot time (unix ms), row count
+LENGTH_PREFIX = struct.Struct('<I')
+MISSING_ETA = -1
+
+HISTORY_COLUMNS = ["timestamp", "route_id", "direction", "stop_number", "eta_seconds", "arrival_status"]
+
+
+def encode_snapshot(timestamp: datetime, dataframe: pd.DataFrame) -> bytes:
+    """
+    Encodes one route's arrivals at one point in time as a compressed block.
+
+    direction is stored as its DIRECTION_DTYPE code and arrival_status as its small-int
+    code (dictionary encoding); stop_number and eta_seconds are stored as differences to
+    the previous stop, which are small along a route and compress well.
+
+    Args:
+        timestamp (datetime): Time of the snapshot.
+        dataframe (pd.DataFrame): direction, stop_number, eta_seconds and arrival_status of one route.
+
+    Returns:
+        bytes: The block, prefixed with its length.
+    """
+    dataframe = dataframe.sort_values(["direction", "stop_number"])
+    directions = pd.Categorical(dataframe["direction"], dtype=DIRECTION_DTYPE).codes.astype(np.uint8)
+    stop_numbers = dataframe["stop_number"].to_numpy(dtype=np.int64)
+    etas = dataframe["eta_seconds"].astype("Int64").fillna(MISSING_ETA).to_numpy(dtype=np.int64)
+    statuses = dataframe["arrival_status"].fillna(0).to_numpy(dtype=np.int8)
+
+    payload = b''.join([
+        BLOCK_HEADER.pack(int(timestamp.timestamp() * 1000), len(dataframe)),
+        directions.tobytes(),
+        np.diff(stop_numbers, prepend=0).astype(np.int16).tobytes(),
+        np.diff(etas, prepend=0).astype(np.int32).tobytes(),
+        statuses.tobytes(),
+    ])
+    block = zlib.compress(payload)
+    return LENGTH_PREFIX.pack(len(block)) + block
+
+
+def decode_snapshots(content: bytes) -> list:
+    """
+    Decodes the blocks of a history file; an incomplete block at the end (a write cut
+    short by a crash) is ignored.
+
+    Returns:
+        list: (timestamp_ms, directions, stop_numbers, etas, statuses) array tuples.
+    """
+    snapshots = []
+    offset = 0
+    while offset + LENGTH_PREFIX.size <= len(content):
+        (length,) = LENGTH_PREFIX.unpack_from(content, offset)
+        offset += LENGTH_PREFIX.size
+        if offset + length > len(content):
+            break
+        payload = zlib.decompress(content[offset:offset + length])
+        offset += length
+
+        timestamp_ms, rows = BLOCK_HEADER.unpack_from(payload)
+        position = BLOCK_HEADER.size
+        arrays = []
+        for dtype in (np.uint8, np.int16, np.int32, np.int8):
+            array = np.frombuffer(payload, dtype=dtype, count=rows, offset=position)
+            position += array.nbytes
+            arrays.append(array)
+        directions, stop_deltas, eta_deltas, statuses = arrays
+        snapshots.append((timestamp_ms, directions, np.cumsum(stop_deltas, dtype=np.int64),
+                          np.cumsum(eta_deltas, dtype=np.int64), statuses))
+    return snapshots
+
+
+class ArrivalHistoryStore:
+    """
+    Append-only arrival snapshots, one file per day and route: <directory>/<YYYY-MM-DD>/<route_id>.arr.
+
+    Reading a route over a date range opens only that route's files of those days.
+    """
+
+    def __init__(self, directory: str = 'data/arrival_history'):
+        """
+        Args:
+            directory (str): Root directory of the daily folders.
+        """
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, day: date, route_id: str) -> str:
+        return os.path.join(self.directory, day.isoformat(), f'{route_id}.arr')
+
+    def append(self, arrivals: pd.DataFrame, timestamp: datetime = None):
+        """
+        Appends one snapshot per route in arrivals.
+
+        Each block is written with a single append, so concurrent writers of the same
+        route do not interleave inside a block.
+
+        Args:
+            arrivals (pd.DataFrame): route_id, direction, stop_number, eta_seconds and
+                arrival_status, e.g. the result of arrival_poller.poll_once().
+            timestamp (datetime): Time of the snapshot; defaults to now.
+        """
+        timestamp = timestamp or datetime.now()
+        day_directory = os.path.join(self.directory, timestamp.date().isoformat())
+        os.makedirs(day_directory, exist_ok=True)
+
+        for route_id, dataframe in arrivals.groupby("route_id", sort=False, observed=True):
+            block = encode_snapshot(timestamp, dataframe)
+            with open(self._path(timestamp.date(), route_id), 'ab') as file:
+                file.write(block)
+
+    def read_route(self, route_id: str, start: datetime = None, end: datetime = None,
+                   days: int = None) -> pd.DataFrame:
+        """
+        Reads the snapshots of one route between start and end.
+
+        Args:
+            route_id (str): The route.
+            start (datetime): First snapshot time to include; defaults to end minus days, or to the oldest day.
+            end (datetime): Last snapshot time to include; defaults to now.
+            days (int): Length of the range when start is not given, e.g. 7 for the last week.
+
+        Returns:
+            pd.DataFrame: timestamp, route_id, direction, stop_number, eta_seconds (nullable)
+                and arrival_status, in time order.
+        """
+        end = end or datetime.now()
+        if start is None and days is not None:
+            start = end - timedelta(days=days)
+
+        start_ms = None if start is None else int(start.timestamp() * 1000)
+        end_ms = int(end.timestamp() * 1000)
+
+        snapshot_times, snapshot_rows = [], []
+        columns = {"direction": [], "stop_number": [], "eta_seconds": [], "arrival_status": []}
+        for day_name in sorted(os.listdir(self.directory)):
+            try:
+                day = date.fromisoformat(day_name)
+            except ValueError:
+                continue
+            if (start is not None and day < start.date()) or day > end.date():
+                continue
+            path = self._path(day, route_id)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as file:
+                snapshots = decode_snapshots(file.read())
+            for timestamp_ms, directions, stop_numbers, etas, statuses in snapshots:
+                if (start_ms is not None and timestamp_ms < start_ms) or timestamp_ms > end_ms:
+                    continue
+                snapshot_times.append(timestamp_ms)
+                snapshot_rows.append(len(directions))
+                columns["direction"].append(directions)
+                columns["stop_number"].append(stop_numbers)
+                columns["eta_seconds"].append(etas)
+                columns["arrival_status"].append(statuses)
+
+        if not snapshot_times:
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+
+        columns = {name: np.concatenate(arrays) for name, arrays in columns.items()}
+        etas = columns["eta_seconds"]
+        # Local wall-clock time, like the datetimes passed to append; tzlocal applies the UTC
+        # offset in effect at each snapshot, so history across a DST change reads back right
+        timestamps = pd.to_datetime(snapshot_times, unit="ms", utc=True).tz_convert(tzlocal()).tz_localize(None)
+        return pd.DataFrame({
+            "timestamp": timestamps.repeat(snapshot_rows),
+            "route_id": pd.Categorical([str(route_id)] * len(etas)),
+            "direction": pd.Categorical.from_codes(columns["direction"], dtype=DIRECTION_DTYPE),
+            "stop_number": columns["stop_number"].astype(np.int16),
+            "eta_seconds": pd.Series(etas, dtype="Int32").mask(etas == MISSING_ETA),
+            "arrival_status": columns["arrival_status"],
+        })
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+This module refreshes only the volatile arrival columns of a watchlist of routes on a
+short interval, without re-crawling their stop names and coordinates.
+"""
+
+import time
+
+import pandas as pd
+
+from cycu11372010.arrival_history import ArrivalHistoryStore
+from cycu11372010.browser_pool import BrowserPool, get_default_pool
+from cycu11372010.ebus_taipei import (COME_TOGGLE_SELECTOR, READY_SELECTORS, STOP_ARRIVAL_UPDATE, _records,
+                                      concat_stop_frames, get_engine, stops_of_route_url, taipei_route_info)
+from cycu11372010.page_wait import wait_until_ready
+
+
+class arrival_poller:
+    """
+    Polls the arrival times of a fixed set of routes and writes them in one transaction per round.
+    """
+
+    def __init__(self, route_ids: list, interval: float = 60, working_directory: str = 'data',
+                 browser_pool: BrowserPool = None, base_url: str = None, history: ArrivalHistoryStore = None):
+        """
+        Args:
+            route_ids (list): Watchlist of route IDs to keep fresh.
+            interval (float): Seconds between the starts of two polling rounds.
+            working_directory (str): Directory holding the SQLite database.
+            browser_pool (BrowserPool): Pool to borrow pages from; defaults to the shared pool.
+            base_url (str): Site root to poll; defaults to EBUS_BASE_URL.
+            history (ArrivalHistoryStore): If given, every round is also appended to it, since
+                the database only keeps the latest arrivals.
+        """
+        self.route_ids = list(route_ids)
+        self.interval = interval
+        self.working_directory = working_directory
+        self.browser_pool = browser_pool or get_default_pool()
+        self.base_url = base_url
+        self.history = history
+        self.engine = get_engine(self.working_directory)
+
+    def _fetch_route(self, route_id: str) -> dict:
+        """
+        Loads a route page once and reads the go arrivals, then the come arrivals after the toggle.
+
+        Returns:
+            dict: Maps 'go'/'come' to the rendered HTML.
+        """
+        url = stops_of_route_url(route_id, self.base_url)
+        contents = {}
+        with self.browser_pool.page() as page:
+            page.goto(url)
+
+            selector, require_text = READY_SELECTORS['go']
+            wait_until_ready(page, selector, 'arrival_go', require_text=require_text)
+            contents['go'] = page.content()
+
+            page.click(COME_TOGGLE_SELECTOR)
+            selector, require_text = READY_SELECTORS['come']
+            wait_until_ready(page, selector, 'arrival_come', require_text=require_text)
+            contents['come'] = page.content()
+        return contents
+
+    def poll_once(self) -> pd.DataFrame:
+        """
+        Fetches every watched route and updates the arrival columns in a single transaction.
+
+        Routes that fail are reported and skipped; the others are still written.
+
+        Returns:
+            pd.DataFrame: route_id, direction, stop_number, arrival_info, eta_seconds and
+                arrival_status of this round.
+        """
+        frames = []
+        for route_id in self.route_ids:
+            try:
+                for direction, content in self._fetch_route(route_id).items():
+                    route_info = taipei_route_info(route_id, direction=direction,
+                                                   working_directory=self.working_directory, content=content)
+                    frames.append(route_info.parse_route_info())
+            except Exception as e:
+                print(f"Error polling arrivals for route {route_id}: {e}")
+
+        columns = ["route_id", "direction", "stop_number", "arrival_info", "eta_seconds", "arrival_status"]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+
+        arrivals = concat_stop_frames(frames)[columns]
+
+        with self.engine.begin() as connection:
+            # Same statement as the unchanged-fingerprint path of taipei_route_info.save_to_database
+            connection.execute(STOP_ARRIVAL_UPDATE, _records(arrivals.add_prefix("b_")))
+        if self.history is not None:
+            self.history.append(arrivals)
+
+        return arrivals
+
+    def run(self, rounds: int = None):
+        """
+        Polls repeatedly, one round every interval seconds.
+
+        Args:
+            rounds (int): Number of rounds to run; None polls until interrupted.
+        """
+        done = 0
+        while rounds is None or done < rounds:
+            started = time.monotonic()
+            arrivals = self.poll_once()
+            done += 1
+            print(f"Round {done}: updated {len(arrivals)} arrival rows for {arrivals['route_id'].nunique()} routes")
+
+            if rounds is None or done < rounds:
+                time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    bus1 = '0161000900'  # 承德幹線
+    bus2 = '0161001500'  # 基隆幹線
+
+    poller = arrival_poller([bus1, bus2], interval=60, history=ArrivalHistoryStore())
+    poller.run()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+This module crawls the StopsOfRoute pages of many routes concurrently with the
+Playwright async API, then parses and stores them through taipei_route_info.
+"""
+
+import asyncio
+import os
+import time
+from urllib.parse import urlparse
+
+import pandas as pd
+from playwright.async_api import async_playwright
+
+from cycu11372010.arrival_history import ArrivalHistoryStore
+from cycu11372010.ebus_taipei import (COME_TOGGLE_SELECTOR, READY_SELECTORS, has_stops, stops_of_route_url,
+                                      taipei_route_info, taipei_route_list)
+from cycu11372010.page_wait import async_read_until, async_wait_until_ready
+from cycu11372010.request_filter import RequestFilter
+from cycu11372010.snapshot_cache import SnapshotCache
+from cycu11372010.telemetry import crawl_telemetry
+
+
+class HostThrottle:
+    """
+    Per-host politeness budget: request starts to the same host are spaced by at least min_interval seconds.
+    """
+
+    def __init__(self, min_interval: float = 0.5):
+        """
+        Args:
+            min_interval (float): Minimum number of seconds between two request starts to one host.
+        """
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._locks = {}
+
+    async def wait(self, url: str):
+        """
+        Sleeps until the host of the given URL may receive another request.
+
+        Args:
+            url (str): The URL about to be requested.
+        """
+        host = urlparse(url).netloc
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class async_route_crawler:
+    """
+    Fetches many routes (both directions per page load) with bounded concurrency and stores the parsed stops.
+    """
+
+    def __init__(self, route_list: taipei_route_list, concurrency: int = 4, min_interval: float = 0.5,
+                 working_directory: str = 'data', request_filter: RequestFilter = None, on_route=None,
+                 base_url: str = None):
+        """
+        Args:
+            route_list (taipei_route_list): Route list whose route_data_updated flags are maintained.
+            concurrency (int): Maximum number of pages rendering at the same time.
+            min_interval (float): Politeness budget per host, see HostThrottle.
+            working_directory (str): Directory holding the SQLite database.
+            request_filter (RequestFilter): Requests to abort on every page; defaults to RequestFilter().
+            on_route (callable): Called as on_route(route_id, frames) after each stored route; the
+                frames are then handed over instead of being collected by crawl().
+            base_url (str): Site root to crawl; defaults to EBUS_BASE_URL.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.route_list = route_list
+        self.concurrency = concurrency
+        self.throttle = HostThrottle(min_interval)
+        self.working_directory = working_directory
+        self.request_filter = request_filter or RequestFilter()
+        self.on_route = on_route
+        self.base_url = base_url
+        self.snapshot_cache = SnapshotCache(os.path.join(working_directory, 'snapshots'))
+        self.history = ArrivalHistoryStore(os.path.join(working_directory, 'arrival_history'))
+
+    async def _read_direction(self, page, direction: str) -> str:
+        selector, require_text = READY_SELECTORS[direction]
+        await async_wait_until_ready(page, selector, f'route_info_{direction}', require_text=require_text)
+        return await async_read_until(page, lambda html: has_stops(html, direction, require_arrivals=True))
+
+    async def _fetch_page(self, browser, route_id: str, url: str) -> tuple:
+        """
+        Renders one StopsOfRoute page in a fresh page, reading it before and after the come toggle.
+
+        The site only fills in arrivals of the visible direction, so the come arrivals are
+        read after clicking the toggle, as arrival_poller does. The server HTML leaves the
+        arrival spans empty, so there is no HTTP fast path: the crawl stores arrivals.
+
+        Returns:
+            tuple: (HTML with the go arrivals, HTML with the come arrivals).
+        """
+        async with self._slots:
+            await self.throttle.wait(url)
+            with crawl_telemetry.stage('fetch_browser', route_id) as extras:
+                page = await browser.new_page()
+                try:
+                    await self.request_filter.install_async(page)
+                    await page.goto(url)
+                    content = await self._read_direction(page, 'go')
+                    await page.click(COME_TOGGLE_SELECTOR)
+                    come_content = await self._read_direction(page, 'come')
+                finally:
+                    await page.close()
+                extras["bytes"] = len(content.encode('utf-8')) + len(come_content.encode('utf-8'))
+                return content, come_content
+
+    async def _crawl_route(self, browser, route_id: str, route_name: str) -> list:
+        """
+        Loads the route page once, then parses both directions, stores and flags the route.
+
+        Returns:
+            list: The parsed DataFrames (go and come), empty if the route failed.
+        """
+        url = stops_of_route_url(route_id, self.base_url)
+
+        try:
+            content, come_content = await self._fetch_page(browser, route_id, url)
+            self.snapshot_cache.put(url, 'both', content)
+            self.snapshot_cache.put(url, 'come', come_content)
+
+            route_info = taipei_route_info(route_id, direction='both', working_directory=self.working_directory,
+                                           content=content, come_content=come_content, base_url=self.base_url)
+            frames = list(route_info.parse_both_directions())
+            route_info.save_to_database(history=self.history)
+
+            for df_tmp in frames:
+                df_tmp['route_name'] = pd.Categorical([route_name] * len(df_tmp))
+
+            if self.on_route is not None:
+                self.on_route(route_id, frames)
+                frames = []
+
+            self.route_list.set_route_data_updated(route_id)
+            print(f"Saved stops for route {route_name} ({route_id})")
+            return frames
+
+        except Exception as e:
+            print(f"Error processing route {route_name}: {e}")
+            self.route_list.set_route_data_unexcepted(route_id)
+            return []
+
+    async def crawl(self, routes: pd.DataFrame) -> list:
+        """
+        Crawls every route in the given DataFrame.
+
+        Args:
+            routes (pd.DataFrame): Rows with 'route_id' and 'route_name' columns.
+
+        Returns:
+            list: Parsed stop DataFrames of all successfully crawled routes (empty with on_route).
+        """
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                results = await asyncio.gather(*(
+                    self._crawl_route(browser, row['route_id'], row['route_name'])
+                    for _, row in routes.iterrows()
+                ))
+            finally:
+                await browser.close()
+
+        # Every page of the crawl got a new snapshot; delete the expired ones
+        self.snapshot_cache.purge_expired()
+        return [frame for frames in results for frame in frames]
+
+
+def crawl_routes(route_list: taipei_route_list, routes: pd.DataFrame, concurrency: int = 4,
+                 min_interval: float = 0.5, on_route=None, base_url: str = None) -> list:
+    """
+    Synchronous entry point for scripts: runs async_route_crawler.crawl on a new event loop.
+
+    Args:
+        route_list (taipei_route_list): Route list whose flags are maintained.
+        routes (pd.DataFrame): Rows with 'route_id' and 'route_name' columns.
+        concurrency (int): Maximum number of pages rendering at the same time.
+        min_interval (float): Minimum seconds between request starts to ebus.gov.taipei.
+        on_route (callable): Receives (route_id, frames) per stored route, see async_route_crawler.
+        base_url (str): Site root to crawl; defaults to EBUS_BASE_URL.
+
+    Returns:
+        list: Parsed stop DataFrames of all successfully crawled routes (empty with on_route).
+    """
+    crawler = async_route_crawler(route_list, concurrency=concurrency, min_interval=min_interval,
+                                  working_directory=route_list.working_directory, on_route=on_route,
+                                  base_url=base_url)
+    return asyncio.run(crawler.crawl(routes))
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps a single headless Chromium alive for the whole crawl and lends
+out reusable pages, so each route only pays for its own navigation.
+"""
+
+import atexit
+import threading
+from contextlib import contextmanager
+
+from playwright.sync_api import sync_playwright
+
+from cycu11372010.request_filter import RequestFilter
+
+
+class BrowserPool:
+    """
+    Manages a shared Playwright browser and a pool of reusable pages.
+
+    Sync Playwright objects only work on the thread that created them, so a pool belongs
+    to the thread that first borrows from it; borrowing from any other thread raises
+    RuntimeError. For concurrency use one pool per process (crawl_worker) or the async
+    crawler.
+    """
+
+    def __init__(self, pool_size: int = 2, max_page_uses: int = 50, headless: bool = True,
+                 page_setup=None):
+        """
+        Initializes the pool. The browser itself is started lazily on the first borrow.
+
+        Args:
+            pool_size (int): Maximum number of idle pages kept for reuse. Nested borrows beyond
+                it still get a page; the extra pages are closed when returned.
+            max_page_uses (int): Number of borrows after which a page (and its context) is recycled.
+            headless (bool): Whether Chromium runs headless.
+            page_setup (callable): Called with every new page before it is lent out,
+                e.g. RequestFilter().install to block assets.
+        """
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        if max_page_uses < 1:
+            raise ValueError("max_page_uses must be at least 1")
+
+        self.pool_size = pool_size
+        self.max_page_uses = max_page_uses
+        self.headless = headless
+        self.page_setup = page_setup
+
+        self._playwright = None
+        self._browser = None
+        self._idle_pages = []
+        self._page_uses = {}
+        self._owner_thread = None
+
+    def _check_thread(self):
+        """
+        Raises:
+            RuntimeError: If called from another thread than the one that started the browser.
+        """
+        current = threading.get_ident()
+        if self._owner_thread is None:
+            self._owner_thread = current
+        elif self._owner_thread != current:
+            raise RuntimeError("BrowserPool is bound to the thread that started it; "
+                               "sync Playwright pages cannot be used from other threads")
+
+    def _ensure_browser(self):
+        """
+        Starts Playwright and launches Chromium if they are not running yet.
+
+        A failed launch stops the driver again, so the next borrow starts from scratch
+        instead of starting a second sync Playwright in the same thread.
+        """
+        self._check_thread()
+        if self._browser is None:
+            self._playwright = sync_playwright().start()
+            try:
+                self._browser = self._playwright.chromium.launch(headless=self.headless)
+            except Exception:
+                self._playwright.stop()
+                self._playwright = None
+                raise
+
+    def _new_page(self):
+        """
+        Opens a fresh page in its own browser context.
+        """
+        context = self._browser.new_context()
+        page = context.new_page()
+        if self.page_setup is not None:
+            self.page_setup(page)
+        self._page_uses[page] = 0
+        return page
+
+    def _discard_page(self, page):
+        """
+        Closes a page together with its context and forgets its usage counter.
+        """
+        self._page_uses.pop(page, None)
+        try:
+            page.context.close()
+        except Exception:
+            pass
+
+    def _checkout(self):
+        page = self._idle_pages.pop() if self._idle_pages else None
+
+        if page is None or page.is_closed():
+            if page is not None:
+                self._discard_page(page)
+            page = self._new_page()
+        return page
+
+    def _checkin(self, page):
+        self._page_uses[page] += 1
+        if (self._page_uses[page] >= self.max_page_uses or page.is_closed()
+                or len(self._idle_pages) >= self.pool_size):
+            self._discard_page(page)
+        else:
+            self._idle_pages.append(page)
+
+    @contextmanager
+    def page(self):
+        """
+        Borrows a page from the pool and returns it when the block exits.
+
+        A page that raised inside the block is discarded instead of being reused.
+
+        Yields:
+            playwright.sync_api.Page: A ready-to-use page.
+        """
+        self._ensure_browser()
+        page = None
+        try:
+            page = self._checkout()
+            yield page
+        except Exception:
+            if page is not None:
+                self._discard_page(page)
+                page = None
+            raise
+        finally:
+            if page is not None:
+                self._checkin(page)
+
+    def close(self):
+        """
+        Closes every idle page, the browser and the Playwright driver.
+        """
+        while self._idle_pages:
+            self._discard_page(self._idle_pages.pop())
+
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+        self._owner_thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_default_pool = None
+
+
+def get_default_pool() -> BrowserPool:
+    """
+    Returns the process-wide pool used when no pool is passed to the scrapers.
+
+    Its pages block images, fonts, stylesheets, map tiles and analytics.
+
+    Returns:
+        BrowserPool: The shared pool, created on first use and closed at exit.
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = BrowserPool(page_setup=RequestFilter().install)
+        atexit.register(close_default_pool)
+    return _default_pool
+
+
+def close_default_pool():
+    """
+    Shuts down the process-wide pool if it was started.
+    """
+    global _default_pool
+    if _default_pool is not None:
+        _default_pool.close()
+        _default_pool = None
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+This module runs the stop crawl in several processes. Each worker has its own
+browser and leases routes from data_route_list, so the sweep scales with the
+number of cores and survives crashed workers.
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import time
+
+from cycu11372010.arrival_history import ArrivalHistoryStore
+from cycu11372010.browser_pool import close_default_pool
+from cycu11372010.ebus_taipei import taipei_route_info, taipei_route_list
+from cycu11372010.snapshot_cache import SnapshotCache
+from cycu11372010.telemetry import crawl_telemetry
+
+
+def run_worker(worker_id: str, working_directory: str = 'data', batch_size: int = 1,
+               lease_seconds: float = 300, idle_interval: float = 5, base_url: str = None) -> int:
+    """
+    Claims and crawls routes until no route is left to claim.
+
+    While other workers still hold unexpired leases the worker keeps polling, so the
+    routes of a worker that crashed are picked up once its leases expire. The worker's
+    stage timings are exported as crawl_telemetry_<worker_id>.prom/.json/.csv.
+
+    Args:
+        worker_id (str): Identifier stored as lease_owner.
+        working_directory (str): Directory holding the SQLite database.
+        batch_size (int): Routes leased per claim.
+        lease_seconds (float): Lease length; must cover crawling batch_size routes.
+        idle_interval (float): Seconds to wait before claiming again when nothing was claimable.
+        base_url (str): Site root to crawl; defaults to EBUS_BASE_URL.
+
+    Returns:
+        int: Number of routes this worker stored.
+    """
+    route_list = taipei_route_list(working_directory=working_directory, fetch=False)
+    history = ArrivalHistoryStore(os.path.join(working_directory, 'arrival_history'))
+    done = 0
+    try:
+        while True:
+            routes = route_list.claim_routes(worker_id, batch_size=batch_size, lease_seconds=lease_seconds)
+            if routes.empty:
+                if not route_list.has_active_leases():
+                    break
+                time.sleep(idle_interval)
+                continue
+
+            for _, row in routes.iterrows():
+                route_id, route_name = row['route_id'], row['route_name']
+                try:
+                    route_info = taipei_route_info(route_id, direction='both', working_directory=working_directory,
+                                                   base_url=base_url)
+                    route_info.parse_both_directions()
+                    route_info.save_to_database(history=history)
+                    route_list.set_route_data_updated(route_id)
+                    done += 1
+                    print(f"[{worker_id}] Saved stops for route {route_name} ({route_id}) via {route_info.fetch_path}")
+                except Exception as e:
+                    print(f"[{worker_id}] Error processing route {route_name}: {e}")
+                    route_list.set_route_data_unexcepted(route_id)
+    finally:
+        close_default_pool()
+        crawl_telemetry.export(working_directory, name=f'crawl_telemetry_{worker_id}')
+    return done
+
+
+def _worker_main(worker_id: str, working_directory: str, batch_size: int, lease_seconds: float, base_url: str):
+    run_worker(worker_id, working_directory=working_directory, batch_size=batch_size, lease_seconds=lease_seconds,
+               base_url=base_url)
+
+
+def run_workers(workers: int = 4, working_directory: str = 'data', batch_size: int = 1,
+                lease_seconds: float = 300, base_url: str = None):
+    """
+    Starts a new sweep (or resumes the unfinished one) and crawls it with several worker processes.
+
+    The route list must already be in the database, e.g. from taipei_route_list().save_to_database().
+
+    Args:
+        workers (int): Number of worker processes, each with its own browser.
+        working_directory (str): Directory holding the SQLite database.
+        batch_size (int): Routes leased per claim.
+        lease_seconds (float): Lease length.
+        base_url (str): Site root to crawl; defaults to EBUS_BASE_URL.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+
+    route_list = taipei_route_list(working_directory=working_directory, fetch=False)
+    print(f"Routes to crawl: {len(route_list.resume_or_start_sweep())}")
+
+    # spawn: every worker starts its own Playwright driver instead of inheriting one
+    context = multiprocessing.get_context('spawn')
+    prefix = f'{socket.gethostname()}-{os.getpid()}'
+    processes = [
+        context.Process(target=_worker_main,
+                        args=(f'{prefix}-{i}', working_directory, batch_size, lease_seconds, base_url))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    # Every page of the sweep got a new snapshot; delete the expired ones once no worker writes
+    removed = SnapshotCache(os.path.join(working_directory, 'snapshots')).purge_expired()
+    print(f"Purged {removed} expired page snapshots")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Crawl every route with several worker processes.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--working-directory', default='data')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--lease-seconds', type=float, default=300)
+    parser.add_argument('--base-url', default=None)
+    args = parser.parse_args()
+
+    run_workers(args.workers, working_directory=args.working_directory,
+                batch_size=args.batch_size, lease_seconds=args.lease_seconds, base_url=args.base_url)
@@ -4,78 +4,470 @@ This module retrieves bus stop data for a specific route and direction from the
 saves the rendered HTML and CSV file, and stores the parsed data in a SQLite database.
 """
 
+import hashlib
+import os
 import re
+import threading
+from datetime import datetime, timedelta
+
 import pandas as pd
-from playwright.sync_api import sync_playwright
-from sqlalchemy import create_engine, Column, String, Float, Integer, Boolean
+import requests
+from sqlalchemy import create_engine, event, inspect, text, update, bindparam, Column, String, Float, Integer, Boolean, DateTime, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import func, or_
 from sqlalchemy.ext.declarative import declarative_base
 
+from cycu11372010.arrival_decoder import decode_arrival_info
+from cycu11372010.browser_pool import BrowserPool, get_default_pool
+from cycu11372010.http_fetch import fetch_html
+from cycu11372010.page_wait import read_until, wait_until_ready
+from cycu11372010.snapshot_cache import SnapshotCache
+from cycu11372010.stop_parser import parse_stops, stops_for_direction
+from cycu11372010.telemetry import crawl_telemetry
+
+
+ROUTE_PATTERN = re.compile(r'<li><a href="javascript:go\(\'(.*?)\'\)">(.*?)</a></li>', re.DOTALL)
+
+
+STOP_PATTERN = re.compile(
+    r'<li>.*?<span class="auto-list-stationlist-position.*?">(.*?)</span>\s*'
+    r'<span class="auto-list-stationlist-number">\s*(\d+)</span>\s*'
+    r'<span class="auto-list-stationlist-place">(.*?)</span>.*?'
+    r'<input[^>]+name="item\.UniStopId"[^>]+value="(\d+)"[^>]*>.*?'
+    r'<input[^>]+name="item\.Latitude"[^>]+value="([\d\.]+)"[^>]*>.*?'
+    r'<input[^>]+name="item\.Longitude"[^>]+value="([\d\.]+)"[^>]*>',
+    re.DOTALL
+)
+
+# Site root; point it at a fixture_server (argument or EBUS_BASE_URL) to crawl offline
+EBUS_BASE_URL = os.environ.get('EBUS_BASE_URL', 'https://ebus.gov.taipei')
+
+# Seconds a connection waits for another process's write lock (crawl workers share the file)
+SQLITE_TIMEOUT = 30
+
+DIRECTION_SECTION_IDS = {'go': 'GoDirectionRoute', 'come': 'BackDirectionRoute'}
+
+# Column types of parsed stops; direction uses fixed categories so go and come frames concatenate as categorical
+DIRECTION_DTYPE = pd.CategoricalDtype(['go', 'come'])
+STOP_DTYPES = {'stop_number': 'int16', 'stop_id': 'int64', 'latitude': 'float64', 'longitude': 'float64'}
+
+# Selector that marks a page as rendered, and whether it must also carry text; the arrival
+# text of a direction is filled in by the site's JS, so its position spans must carry text
+READY_SELECTORS = {
+    'route_list': ('a[href^="javascript:go("]', False),
+    'go': ('#GoDirectionRoute .auto-list-stationlist-position', True),
+    'come': ('#BackDirectionRoute .auto-list-stationlist-position', True),
+}
+
+# Toggle that renders the come block; the site only fills in arrivals of the visible direction
+COME_TOGGLE_SELECTOR = 'a.stationlist-come-go-gray.stationlist-come'
+
+
+def route_list_url(base_url: str = None) -> str:
+    """
+    Returns:
+        str: URL of the all-routes page under base_url (default EBUS_BASE_URL).
+    """
+    return f'{(base_url or EBUS_BASE_URL).rstrip("/")}/ebus?ct=all'
+
+
+def stops_of_route_url(route_id: str, base_url: str = None) -> str:
+    """
+    Returns:
+        str: URL of a route's StopsOfRoute page under base_url (default EBUS_BASE_URL).
+    """
+    return f'{(base_url or EBUS_BASE_URL).rstrip("/")}/Route/StopsOfRoute?routeid={route_id}'
+
+
+def _direction_sections(content: str) -> dict:
+    """
+    Splits a StopsOfRoute page into the HTML of its go and come blocks.
+
+    Each block runs from its div id to the start of the other block (or the end of the page).
+
+    Args:
+        content (str): The rendered page HTML.
+
+    Returns:
+        dict: Maps 'go'/'come' to their HTML slice; directions whose block is missing are left out.
+    """
+    positions = {}
+    for direction, section_id in DIRECTION_SECTION_IDS.items():
+        index = content.find(f'id="{section_id}"')
+        if index != -1:
+            positions[direction] = index
+
+    ordered = sorted(positions.items(), key=lambda item: item[1])
+    sections = {}
+    for i, (direction, start) in enumerate(ordered):
+        end = ordered[i + 1][1] if i + 1 < len(ordered) else len(content)
+        sections[direction] = content[start:end]
+    return sections
+
+
+def _direction_has_stops(stops: dict, direction: str, require_arrivals: bool = False) -> bool:
+    """
+    Args:
+        stops (dict): parse_stops output.
+        direction (str): 'go', 'come' or 'both'.
+        require_arrivals (bool): Also require each block to have at least one non-empty arrival_info.
+
+    Returns:
+        bool: True if every requested direction block has at least one stop.
+    """
+    directions = ['go', 'come'] if direction == 'both' else [direction]
+    for d in directions:
+        stations = stops_for_direction(stops, d)
+        if not stations or (require_arrivals and not any(station[0] for station in stations)):
+            return False
+    return True
+
+
+def has_stops(content: str, direction: str, require_arrivals: bool = False) -> bool:
+    """
+    Tells whether a StopsOfRoute page already carries the stops of the given direction.
+
+    It runs on every fetched page and on every re-read while waiting for one, so it uses
+    the single-pass parse_stops rather than STOP_PATTERN.
+
+    Args:
+        content (str): Rendered page HTML.
+        direction (str): 'go', 'come' or 'both'.
+        require_arrivals (bool): Also require the arrival text to be filled in; the server
+            HTML has the position spans but leaves them empty until the site's JS runs.
+
+    Returns:
+        bool: True if every requested direction block has at least one stop.
+    """
+    return _direction_has_stops(parse_stops(content), direction, require_arrivals)
+
+
+def route_fingerprint(dataframe: pd.DataFrame) -> str:
+    """
+    Hashes the static fields of one route direction's stops.
+
+    Only stop_number, stop_id, stop_name, latitude and longitude take part, so a
+    changing arrival_info leaves the fingerprint untouched.
+
+    Args:
+        dataframe (pd.DataFrame): Stops of a single route direction.
+
+    Returns:
+        str: SHA-1 hex digest of the stop sequence.
+    """
+    rows = sorted(
+        (int(row.stop_number), int(row.stop_id), str(row.stop_name), repr(float(row.latitude)), repr(float(row.longitude)))
+        for row in dataframe.itertuples(index=False)
+    )
+    canonical = "\n".join("|".join(str(value) for value in row) for row in rows)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def concat_stop_frames(frames: list) -> pd.DataFrame:
+    """
+    Concatenates parsed stop DataFrames of several routes, keeping route_id and route_name categorical.
+
+    A plain pd.concat turns categoricals with different categories into object columns.
+
+    Args:
+        frames (list): DataFrames from parse_route_info / parse_both_directions.
+
+    Returns:
+        pd.DataFrame: All rows, with a fresh RangeIndex.
+    """
+    dataframe = pd.concat(frames, ignore_index=True)
+    for column in ['route_id', 'route_name']:
+        parts = [frame[column] for frame in frames if column in frame]
+        if parts and len(parts) == len(frames) and all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            dataframe[column] = pd.api.types.union_categoricals(parts)
+    return dataframe
+
+
+def _enable_wal(engine):
+    """
+    Switches every connection of the engine to WAL journaling, so readers do not block the
+    crawl's writers and each commit appends to the log instead of rewriting the journal.
+
+    Args:
+        engine: SQLAlchemy engine of a SQLite database.
+    """
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
+def _upsert(table, keep: tuple = ()):
+    """
+    Args:
+        table (sqlalchemy.Table): The table to write.
+        keep (tuple): Columns whose stored value is left alone when the row already exists.
+
+    Returns:
+        Insert: INSERT ... ON CONFLICT (primary key) DO UPDATE of every other column; run it
+            with a list of row dicts for one executemany.
+    """
+    statement = sqlite_insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[column.name for column in table.primary_key],
+        set_={column.name: statement.excluded[column.name] for column in table.columns
+              if not column.primary_key and column.name not in keep},
+    )
+
+
+def _records(dataframe: pd.DataFrame) -> list:
+    """
+    Returns:
+        list: The rows as dicts of plain Python values, with missing values (e.g. a NULL
+            eta_seconds) as None so they can be bound to SQLite.
+    """
+    return dataframe.astype(object).where(dataframe.notna(), None).to_dict("records")
+
+
+def _add_missing_columns(engine, table):
+    """
+    Adds columns declared on the ORM table but missing from an existing SQLite table.
+
+    create_all only creates missing tables, so databases from earlier sweeps need this
+    to pick up new columns and their indexes.
+
+    Args:
+        engine: SQLAlchemy engine of the database.
+        table (sqlalchemy.Table): The declared table.
+    """
+    existing = {column['name'] for column in inspect(engine).get_columns(table.name)}
+    with engine.begin() as connection:
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+Base = declarative_base()
+
+
+class bus_route_orm(Base):
+    __tablename__ = 'data_route_list'
+
+    route_id = Column(String, primary_key=True)
+    route_name = Column(String)
+    route_data_updated = Column(Integer, default=0)  # 0 pending, 1 done, 2 unexpected
+    attempts = Column(Integer, default=0)
+    last_attempt = Column(DateTime)
+    last_success = Column(DateTime)
+    lease_owner = Column(String)  # worker currently crawling the route
+    lease_expires = Column(DateTime)
+
+
+class bus_stop_orm(Base):
+    __tablename__ = "data_route_info_busstop"
+    stop_id = Column(Integer)
+    arrival_info = Column(String)
+    eta_seconds = Column(Integer)  # decoded from arrival_info at parse time, NULL when no bus is due
+    arrival_status = Column(Integer)  # ARRIVAL_* code of arrival_decoder
+    stop_number = Column(Integer, primary_key=True)
+    stop_name = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    direction = Column(String, primary_key=True)
+    route_id = Column(String, primary_key=True)
+    # The primary key starts with stop_number, so every lookup path needs its own index;
+    # get_engine adds them to existing databases. Bounding boxes use STOP_RTREE instead,
+    # since a B-tree on (latitude, longitude) can only range-search latitude
+    __table_args__ = (
+        Index("ix_data_route_info_busstop_route", "route_id", "direction", "stop_number"),
+        Index("ix_data_route_info_busstop_stop_id", "stop_id"),
+        Index("ix_data_route_info_busstop_stop_name", "stop_name"),
+        Index("ix_data_route_info_busstop_eta_seconds", "eta_seconds"),
+    )
+
+
+class route_fingerprint_orm(Base):
+    __tablename__ = "data_route_fingerprint"
+    route_id = Column(String, primary_key=True)
+    direction = Column(String, primary_key=True)
+    fingerprint = Column(String)
+    updated_at = Column(DateTime)
+
+
+# Statements of the stop save path, built once
+STOP_COLUMNS = [column.name for column in bus_stop_orm.__table__.columns]
+ARRIVAL_COLUMNS = ['arrival_info', 'eta_seconds', 'arrival_status']
+STOP_UPSERT = _upsert(bus_stop_orm.__table__)
+# For a direction whose arrivals were not rendered: new static fields, stored arrivals kept
+STOP_STATIC_UPSERT = _upsert(bus_stop_orm.__table__, keep=tuple(ARRIVAL_COLUMNS))
+FINGERPRINT_UPSERT = _upsert(route_fingerprint_orm.__table__)
+STOP_ARRIVAL_UPDATE = (
+    update(bus_stop_orm.__table__)
+    .where(bus_stop_orm.route_id == bindparam("b_route_id"))
+    .where(bus_stop_orm.direction == bindparam("b_direction"))
+    .where(bus_stop_orm.stop_number == bindparam("b_stop_number"))
+    .values(arrival_info=bindparam("b_arrival_info"), eta_seconds=bindparam("b_eta_seconds"),
+            arrival_status=bindparam("b_arrival_status"))
+)
+
+# R-tree on the stop coordinates, keyed by the rowid of the stop row (kept by upserts)
+STOP_RTREE = 'data_route_info_busstop_rtree'
+STOP_RTREE_SQL = [
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {STOP_RTREE} USING rtree(stop_rowid, min_lat, max_lat, min_lon, max_lon)',
+    # Superseded by the R-tree
+    'DROP INDEX IF EXISTS ix_data_route_info_busstop_lat_lon',
+]
+STOP_RTREE_REBUILD = [
+    f'DELETE FROM {STOP_RTREE}',
+    f'INSERT INTO {STOP_RTREE} (stop_rowid, min_lat, max_lat, min_lon, max_lon) '
+    'SELECT rowid, latitude, latitude, longitude, longitude FROM data_route_info_busstop',
+]
+STOP_RTREE_SYNC = text(
+    f'INSERT OR REPLACE INTO {STOP_RTREE} (stop_rowid, min_lat, max_lat, min_lon, max_lon) '
+    'SELECT rowid, latitude, latitude, longitude, longitude FROM data_route_info_busstop '
+    'WHERE route_id = :route_id AND direction = :direction'
+)
+
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.Lock()
+
+
+def _database_path(working_directory: str) -> str:
+    return os.path.abspath(os.path.join(working_directory, 'hermes_ebus_taipei.sqlite3'))
+
+
+def _create_stop_rtree(engine):
+    """
+    Creates STOP_RTREE and fills it from the stop rows when it is out of step with them,
+    e.g. for a database from before the R-tree existed.
+    """
+    with engine.begin() as connection:
+        for statement in STOP_RTREE_SQL:
+            connection.execute(text(statement))
+        stops = connection.execute(text('SELECT COUNT(*) FROM data_route_info_busstop')).scalar()
+        indexed = connection.execute(text(f'SELECT COUNT(*) FROM {STOP_RTREE}')).scalar()
+        if stops != indexed:
+            for statement in STOP_RTREE_REBUILD:
+                connection.execute(text(statement))
+
+
+def stops_in_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                  working_directory: str = 'data') -> pd.DataFrame:
+    """
+    Finds the stops inside a longitude/latitude box with an R-tree lookup.
+
+    The R-tree stores 32-bit bounds rounded outwards, so its candidates are checked
+    against the stored coordinates.
+
+    Args:
+        min_lon, min_lat, max_lon, max_lat (float): The box in WGS84 degrees.
+        working_directory (str): Directory holding the SQLite database.
+
+    Returns:
+        pd.DataFrame: The matching rows of data_route_info_busstop.
+    """
+    query = text(
+        f'SELECT s.* FROM {STOP_RTREE} r JOIN data_route_info_busstop s ON s.rowid = r.stop_rowid '
+        'WHERE r.max_lat >= :min_lat AND r.min_lat <= :max_lat AND r.max_lon >= :min_lon AND r.min_lon <= :max_lon '
+        'AND s.latitude BETWEEN :min_lat AND :max_lat AND s.longitude BETWEEN :min_lon AND :max_lon'
+    )
+    with get_engine(working_directory).connect() as connection:
+        return pd.read_sql(query, connection, params={
+            "min_lon": min_lon, "min_lat": min_lat, "max_lon": max_lon, "max_lat": max_lat,
+        })
+
+
+def get_engine(working_directory: str = 'data'):
+    """
+    Returns the process-wide engine of a working directory's database.
+
+    The engine is created on first use, together with the schema (missing tables, columns
+    and indexes), so later calls skip connection setup and metadata reflection.
+
+    Args:
+        working_directory (str): Directory holding hermes_ebus_taipei.sqlite3.
+
+    Returns:
+        Engine: The shared SQLAlchemy engine, keyed by the absolute database path.
+    """
+    db_file = _database_path(working_directory)
+    with _engines_lock:
+        engine = _engines.get(db_file)
+        if engine is None:
+            engine = create_engine(f'sqlite:///{db_file}', connect_args={'timeout': SQLITE_TIMEOUT})
+            _enable_wal(engine)
+            Base.metadata.create_all(engine)
+            for table in Base.metadata.sorted_tables:
+                _add_missing_columns(engine, table)
+            _create_stop_rtree(engine)
+            _engines[db_file] = engine
+            _session_factories[db_file] = sessionmaker(bind=engine)
+        return engine
+
+
+def get_session(working_directory: str = 'data'):
+    """
+    Returns:
+        Session: A new session on the shared engine of the working directory's database.
+    """
+    get_engine(working_directory)
+    return _session_factories[_database_path(working_directory)]()
+
 
 class taipei_route_list:
     """
     Manages fetching, parsing, and storing route data for Taipei eBus.
     """
 
-    def __init__(self, working_directory: str = 'data'):
+    def __init__(self, working_directory: str = 'data', browser_pool: BrowserPool = None, fetch: bool = True,
+                 base_url: str = None):
         """
         Initializes the taipei_route_list, fetches webpage content,
         configures the ORM, and sets up the SQLite database.
 
         Args:
             working_directory (str): Directory to store the HTML and database files.
+            browser_pool (BrowserPool): Pool to borrow a page from; defaults to the shared pool.
+            fetch (bool): Whether to fetch the route list page; crawl workers only need the database.
+            base_url (str): Site root to fetch from; defaults to EBUS_BASE_URL.
         """
         self.working_directory = working_directory
 
         #check if the working directory exists , if not create it
-        import os
-        if not os.path.exists(self.working_directory):
-            os.makedirs(self.working_directory)
+        os.makedirs(self.working_directory, exist_ok=True)
 
-        self.url = 'https://ebus.gov.taipei/ebus?ct=all'
+        self.url = route_list_url(base_url)
         self.content = None
+        self.browser_pool = browser_pool or get_default_pool()
 
         # Fetch webpage content
-        self._fetch_content()
-
-        # Setup ORM base and table
-        Base = declarative_base()
-
-        class bus_route_orm(Base):
-            __tablename__ = 'data_route_list'
-
-            route_id = Column(String, primary_key=True)
-            route_name = Column(String)
-            route_data_updated = Column(Integer, default=0)
+        if fetch:
+            self._fetch_content()
 
+        # Shared engine and session of the database; the schema is set up once per process
         self.orm = bus_route_orm
+        self.engine = get_engine(self.working_directory)
+        self.session = get_session(self.working_directory)
 
-        # Create and connect to the SQLite engine
-        self.engine = create_engine(f'sqlite:///{self.working_directory}/hermes_ebus_taipei.sqlite3')
-        self.engine.connect()
-        Base.metadata.create_all(self.engine)
-
-        # Create session
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
-
+    @crawl_telemetry.timed('fetch_route_list', bytes_attr='content')
     def _fetch_content(self):
         """
-        Fetches the webpage content using Playwright and saves it as a local HTML file.
+        Fetches the webpage content with a pooled Playwright page and saves it as a local HTML file.
         """
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
+        with self.browser_pool.page() as page:
             page.goto(self.url)
-            page.wait_for_timeout(3000)  # Wait for the page to load
-            self.content = page.content()
-            browser.close()
+            selector, require_text = READY_SELECTORS['route_list']
+            wait_until_ready(page, selector, 'route_list', require_text=require_text)
+            self.content = read_until(page, lambda html: ROUTE_PATTERN.search(html) is not None)
 
         # Save the rendered HTML to a file for inspection
         html_file_path = f'{self.working_directory}/hermes_ebus_taipei_route_list.html'
         with open(html_file_path, "w", encoding="utf-8") as file:
             file.write(self.content)
 
+    @crawl_telemetry.timed('parse_route_list')
     def parse_route_list(self) -> pd.DataFrame:
         """
         Parses bus route data from the fetched HTML content.
@@ -86,8 +478,7 @@ class taipei_route_list:
         Raises:
             ValueError: If no route data is found.
         """
-        pattern = r'<li><a href="javascript:go\(\'(.*?)\'\)">(.*?)</a></li>'
-        matches = re.findall(pattern, self.content, re.DOTALL)
+        matches = ROUTE_PATTERN.findall(self.content)
 
         if not matches:
             raise ValueError("No data found for route table")
@@ -96,13 +487,19 @@ class taipei_route_list:
         self.dataframe = pd.DataFrame(bus_routes, columns=["route_id", "route_name"])
         return self.dataframe
 
+    @crawl_telemetry.timed('save_route_list')
     def save_to_database(self):
         """
-        Saves the parsed bus route data to the SQLite database via SQLAlchemy ORM.
-        """
-        for _, row in self.dataframe.iterrows():
-            self.session.merge(self.orm(route_id=row['route_id'], route_name=row['route_name']))
+        Saves the parsed bus route data with one executemany upsert.
 
+        Existing routes only get their name updated; their crawl state is kept.
+        """
+        table = self.orm.__table__
+        statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.route_id], set_={"route_name": statement.excluded.route_name}
+        )
+        self.session.execute(statement, _records(self.dataframe[["route_id", "route_name"]]))
         self.session.commit()
 
     def read_from_database(self) -> pd.DataFrame:
@@ -116,28 +513,167 @@ class taipei_route_list:
         self.db_dataframe = pd.read_sql(query.statement, self.session.bind)
         return self.db_dataframe
 
+    @crawl_telemetry.timed('set_route_data_updated')
     def set_route_data_updated(self, route_id: str, route_data_updated: int = 1):
         """
         Sets the route_data_updated flag in the database.
 
+        Marking a route done (1) also stamps last_success and clears its attempt counter.
+
         Args:
             route_id (str): The ID of the bus route.
-            route_data_updated (bool): The value to set for the route_data_updated flag.
+            route_data_updated (int): The value to set for the route_data_updated flag.
         """
-        self.session.query(self.orm).filter_by(route_id=route_id).update({"route_data_updated": route_data_updated})
-        self.session.commit()
+        values = {"route_data_updated": route_data_updated, "lease_owner": None, "lease_expires": None}
+        if route_data_updated == 1:
+            now = datetime.now()
+            values.update({"attempts": 0, "last_attempt": now, "last_success": now})
 
+        self.session.query(self.orm).filter_by(route_id=route_id).update(values)
+        self.session.commit()
 
+    @crawl_telemetry.timed('set_route_data_unexcepted')
     def set_route_data_unexcepted(self, route_id: str):
-        self.session.query(self.orm).filter_by(route_id=route_id).update({"route_data_updated": 2 })
+        """
+        Marks a route as failed (2), counting the attempt for the retry backoff, and releases its lease.
+
+        Args:
+            route_id (str): The ID of the bus route.
+        """
+        self.session.query(self.orm).filter_by(route_id=route_id).update({
+            "route_data_updated": 2,
+            "attempts": func.coalesce(self.orm.attempts, 0) + 1,
+            "last_attempt": datetime.now(),
+            "lease_owner": None,
+            "lease_expires": None,
+        })
         self.session.commit()
 
+    def read_pending_routes(self, max_attempts: int = 5, base_delay: float = 60) -> pd.DataFrame:
+        """
+        Reads the routes a resumed sweep still has to crawl.
+
+        Routes in state 0 are always pending. Routes in state 2 are retried with an
+        exponential backoff (base_delay * 2 ** (attempts - 1) seconds after the last
+        attempt) until they have failed max_attempts times.
+
+        Args:
+            max_attempts (int): Failures after which a route is left alone.
+            base_delay (float): Seconds to wait before the first retry.
+
+        Returns:
+            pd.DataFrame: Pending routes, in route_id order.
+        """
+        routes = self.read_from_database()
+        attempts = routes["attempts"].fillna(0).astype(int)
+        last_attempt = pd.to_datetime(routes["last_attempt"])
+        retry_after = last_attempt + pd.to_timedelta(base_delay * 2.0 ** (attempts - 1).clip(lower=0), unit="s")
+
+        pending = routes["route_data_updated"].fillna(0) == 0
+        retry = (
+            (routes["route_data_updated"] == 2)
+            & (attempts < max_attempts)
+            & (last_attempt.isna() | (retry_after <= datetime.now()))
+        )
+        return routes[pending | retry].sort_values("route_id").reset_index(drop=True)
+
+    def resume_or_start_sweep(self, max_attempts: int = 5, base_delay: float = 60) -> pd.DataFrame:
+        """
+        Returns the routes to crawl now: the rest of an unfinished sweep, or all routes of a new one.
+
+        A sweep is unfinished while any route is pending (0) or failed (2) with attempts
+        left; only then is the previous progress kept. self.sweep_resumed records which case
+        applied, so exports can continue their partial output.
+
+        Args:
+            max_attempts (int): Failures after which a route is left alone.
+            base_delay (float): Seconds to wait before the first retry.
+
+        Returns:
+            pd.DataFrame: Routes to crawl, in route_id order.
+        """
+        routes = self.read_from_database()
+        attempts = routes["attempts"].fillna(0)
+        unfinished = (routes["route_data_updated"].fillna(0) == 0) | (
+            (routes["route_data_updated"] == 2) & (attempts < max_attempts)
+        )
+        self.sweep_resumed = bool(unfinished.any())
+        if not self.sweep_resumed:
+            self.reset_route_data_updated()
+        return self.read_pending_routes(max_attempts=max_attempts, base_delay=base_delay)
+
+    def reset_route_data_updated(self):
+        """
+        Starts a new sweep: every route goes back to pending with a cleared attempt counter.
+        """
+        self.session.query(self.orm).update({
+            "route_data_updated": 0, "attempts": 0, "lease_owner": None, "lease_expires": None,
+        })
+        self.session.commit()
+
+    def claim_routes(self, worker_id: str, batch_size: int = 1, lease_seconds: float = 300,
+                     max_attempts: int = 5, base_delay: float = 60) -> pd.DataFrame:
+        """
+        Leases up to batch_size pending routes to a worker.
+
+        A route can be claimed when read_pending_routes would return it and it has no
+        lease or its lease has expired, so routes of a crashed worker are reclaimed once
+        lease_seconds have passed. Each lease is taken with a conditional UPDATE that also
+        requires the state and attempt count read here, which SQLite runs under its write
+        lock, so a route another worker claimed or finished in the meantime is skipped.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+            batch_size (int): Maximum number of routes to claim.
+            lease_seconds (float): How long the worker may hold the routes.
+            max_attempts (int): Failures after which a route is left alone.
+            base_delay (float): Seconds to wait before the first retry.
+
+        Returns:
+            pd.DataFrame: The claimed routes; empty when nothing is claimable.
+        """
+        while True:
+            now = datetime.now()
+            routes = self.read_pending_routes(max_attempts=max_attempts, base_delay=base_delay)
+            lease_expires = pd.to_datetime(routes["lease_expires"])
+            candidates = routes[lease_expires.isna() | (lease_expires < now)]
+            if candidates.empty:
+                return candidates
+
+            expires = now + timedelta(seconds=lease_seconds)
+            claimed = 0
+            candidates = candidates.head(batch_size)
+            states = candidates["route_data_updated"].fillna(0).astype(int)
+            attempts = candidates["attempts"].fillna(0).astype(int)
+            for route_id, state, attempt in zip(candidates["route_id"], states, attempts):
+                claimed += self.session.query(self.orm).filter(
+                    self.orm.route_id == route_id,
+                    func.coalesce(self.orm.route_data_updated, 0) == int(state),
+                    func.coalesce(self.orm.attempts, 0) == int(attempt),
+                    or_(self.orm.lease_expires.is_(None), self.orm.lease_expires < now),
+                ).update({"lease_owner": worker_id, "lease_expires": expires}, synchronize_session=False)
+            self.session.commit()
+
+            if claimed:
+                query = self.session.query(self.orm).filter_by(lease_owner=worker_id, lease_expires=expires)
+                return pd.read_sql(query.statement, self.session.bind)
+
+    def has_active_leases(self) -> bool:
+        """
+        Returns:
+            bool: True while some unfinished route is leased and the lease has not expired.
+        """
+        return self.session.query(self.orm).filter(
+            self.orm.route_data_updated != 1,
+            self.orm.lease_expires >= datetime.now(),
+        ).first() is not None
+
     def __del__(self):
         """
-        Closes the session and engine when the object is deleted.
+        Closes the session when the object is deleted; the shared engine stays open.
         """
-        self.session.close()
-        self.engine.dispose()
+        if hasattr(self, 'session'):
+            self.session.close()
 
 
 class taipei_route_info:
@@ -145,120 +681,288 @@ class taipei_route_info:
     Manages fetching, parsing, and storing bus stop data for a specified route and direction.
     """
 
-    def __init__(self, route_id: str, direction: str = 'go', working_directory: str = 'data'):
+    def __init__(self, route_id: str, direction: str = 'go', working_directory: str = 'data',
+                 browser_pool: BrowserPool = None, content: str = None, use_http: bool = None,
+                 from_cache: bool = False, snapshot_cache: SnapshotCache = None, base_url: str = None,
+                 parser_backend: str = 'auto', come_content: str = None, need_arrivals: bool = True):
         """
         Initializes the taipei_route_info by setting parameters and fetching the webpage content.
 
+        Without need_arrivals the page is first requested over plain HTTP, and the browser is
+        only used when the server HTML carries no stops; the server HTML leaves the arrival
+        spans empty, so callers that need arrivals go straight to the browser. With direction 'both' and need_arrivals, the browser reads
+        the go block, clicks the come toggle and reads the page again, so the come arrivals
+        are rendered too (self.come_content). Every fetched
+        page is stored in the snapshot cache; from_cache=True reads it back instead of fetching.
+        fetch_path records where the HTML came from ('http', 'browser', 'cache' or 'given').
+
         Args:
             route_id (str): The unique identifier of the bus route.
-            direction (str): The direction of the route; must be either 'go' or 'come'.
+            direction (str): The direction of the route; 'go', 'come', or 'both' to read
+                both directions from a single page load.
+            working_directory (str): Directory to store the HTML and database files.
+            browser_pool (BrowserPool): Pool to borrow a page from; defaults to the shared pool.
+            content (str): Already rendered page HTML; when given, no fetch is made.
+            use_http (bool): Try the HTTP-only fast path before rendering in a browser; defaults
+                to not need_arrivals.
+            from_cache (bool): Load the newest non-expired snapshot instead of fetching.
+            snapshot_cache (SnapshotCache): Cache to use; defaults to <working_directory>/snapshots.
+            base_url (str): Site root to fetch from; defaults to EBUS_BASE_URL.
+            parser_backend (str): How stations are extracted: 'auto', 'html.parser' or 'lxml' for
+                the single-pass parser of stop_parser, 'regex' for STOP_PATTERN.
+            come_content (str): With direction 'both', the page HTML read after clicking the come
+                toggle; the come stops and arrivals are then taken from it.
+            need_arrivals (bool): Whether the caller uses arrival_info; when False, server HTML
+                with empty arrival spans is accepted and the come toggle is not clicked.
+
+        Raises:
+            FileNotFoundError: If from_cache is set and there is no fresh snapshot.
         """
         self.route_id = route_id
         self.direction = direction
-        self.content = None
-        self.url = f'https://ebus.gov.taipei/Route/StopsOfRoute?routeid={route_id}'
+        self.content = content
+        self.come_content = come_content
+        self.url = stops_of_route_url(route_id, base_url)
         self.working_directory = working_directory
-
-        if self.direction not in ['go', 'come']:
-            raise ValueError("Direction must be 'go' or 'come'")
-
-        self._fetch_content()
+        self.browser_pool = browser_pool or get_default_pool()
+        self.fetch_path = 'given'
+        self._http_attempted = False
+        self.parser_backend = parser_backend
+        self.need_arrivals = need_arrivals
+        self._parsed_stops = {}
+
+        if self.direction not in ['go', 'come', 'both']:
+            raise ValueError("Direction must be 'go', 'come' or 'both'")
+        if self.parser_backend not in ['auto', 'html.parser', 'lxml', 'regex']:
+            raise ValueError("parser_backend must be 'auto', 'html.parser', 'lxml' or 'regex'")
+
+        os.makedirs(self.working_directory, exist_ok=True)
+        self.snapshot_cache = snapshot_cache or SnapshotCache(os.path.join(self.working_directory, 'snapshots'))
+
+        if self.content is None and from_cache:
+            # go and both are the same single page load; come falls back to it for the static fields
+            for cached_direction in dict.fromkeys([self.direction, 'both', 'go']):
+                self.content = self.snapshot_cache.get(self.url, cached_direction)
+                if self.content is not None:
+                    break
+            if self.content is None:
+                raise FileNotFoundError(f"No cached snapshot for route ID {self.route_id} direction {self.direction}")
+            if self.direction == 'both':
+                self.come_content = self.snapshot_cache.get(self.url, 'come')
+            self.fetch_path = 'cache'
+
+        if use_http is None:
+            use_http = not self.need_arrivals
+        if self.content is None and use_http and self.direction != 'come':
+            self._fetch_content_http()
+
+        if self.content is None:
+            self._fetch_content()
+
+        if self.fetch_path in ['http', 'browser']:
+            self.snapshot_file = self.snapshot_cache.put(self.url, self.direction, self.content)
+            if self.come_content is not None:
+                self.snapshot_cache.put(self.url, 'come', self.come_content)
+
+    def _fetch_content_http(self):
+        """
+        Downloads the page without rendering it and keeps it only if the stops (and, with
+        need_arrivals, their arrival text) are already in the markup.
+        """
+        self._http_attempted = True
+        with crawl_telemetry.stage('fetch_http', self.route_id) as extras:
+            try:
+                content = fetch_html(self.url)
+            except requests.RequestException:
+                extras["ok"] = False
+                return
+            extras["bytes"] = len(content.encode('utf-8'))
+
+        if self._has_stops(content, self.direction, 'content'):
+            self.content = content
+            self.fetch_path = 'http'
+        else:
+            self._parsed_stops.clear()
 
     def _fetch_content(self):
         """
-        Fetches the webpage content using Playwright and writes the rendered HTML to a local file.
-        """
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(self.url)
+        Fetches the webpage content with a pooled Playwright page.
 
-            if self.direction == 'come':
-                page.click('a.stationlist-come-go-gray.stationlist-come')
+        Following an HTTP attempt that found no stops, it is recorded as a retry.
+        """
+        with crawl_telemetry.stage('fetch_browser', self.route_id) as extras:
+            extras["retries"] = int(self._http_attempted)
+            with self.browser_pool.page() as page:
+                page.goto(self.url)
+
+                if self.direction != 'come':
+                    self.content = self._read_direction(page, 'go', 'content')
+                if self.direction == 'come':
+                    page.click(COME_TOGGLE_SELECTOR)
+                    self.content = self._read_direction(page, 'come', 'content')
+                elif self.direction == 'both' and self.need_arrivals:
+                    page.click(COME_TOGGLE_SELECTOR)
+                    self.come_content = self._read_direction(page, 'come', 'come_content')
+            extras["bytes"] = len(self.content.encode('utf-8')) + len((self.come_content or '').encode('utf-8'))
+        self.fetch_path = 'browser'
+
+    def _read_direction(self, page, direction: str, source: str) -> str:
+        """
+        Waits until the given direction block of the loaded page is rendered and returns the page HTML.
+        """
+        selector, require_text = READY_SELECTORS[direction]
+        wait_until_ready(page, selector, f'route_info_{direction}', require_text=require_text)
+        return read_until(page, lambda html: self._has_stops(html, direction, source))
 
-            page.wait_for_timeout(3000)  # Wait for page render
-            self.content = page.content()
-            browser.close()
+    def _has_stops(self, content: str, direction: str, source: str) -> bool:
+        """
+        has_stops that keeps the parsed stations, so _parse_direction does not parse the
+        accepted page again. read_until returns the last HTML it checked, which is the
+        one parsed last.
 
-        # Save the rendered HTML to a file for inspection
-        self.html_file = f"{self.working_directory}/ebus_taipei_{self.route_id}.html"
-        
-        # with open(html_file, "w", encoding="utf-8") as file:
-        #     file.write(self.content)
+        Args:
+            source (str): Attribute the HTML will be stored in, 'content' or 'come_content'.
+        """
+        backend = 'auto' if self.parser_backend == 'regex' else self.parser_backend
+        self._parsed_stops[source] = parse_stops(content, backend)
+        return _direction_has_stops(self._parsed_stops[source], direction, self.need_arrivals)
 
     def parse_route_info(self) -> pd.DataFrame:
         """
         Parses the fetched HTML content to extract bus stop data.
 
+        With direction 'both', both direction blocks are parsed and concatenated;
+        use parse_both_directions to get them separately.
+
         Returns:
-            pd.DataFrame: DataFrame containing bus stop information.
+            pd.DataFrame: DataFrame containing bus stop information, typed as STOP_DTYPES
+                with categorical direction and route_id.
 
         Raises:
             ValueError: If no data is found for the route.
         """
-        pattern = re.compile(
-            r'<li>.*?<span class="auto-list-stationlist-position.*?">(.*?)</span>\s*'
-            r'<span class="auto-list-stationlist-number">\s*(\d+)</span>\s*'
-            r'<span class="auto-list-stationlist-place">(.*?)</span>.*?'
-            r'<input[^>]+name="item\.UniStopId"[^>]+value="(\d+)"[^>]*>.*?'
-            r'<input[^>]+name="item\.Latitude"[^>]+value="([\d\.]+)"[^>]*>.*?'
-            r'<input[^>]+name="item\.Longitude"[^>]+value="([\d\.]+)"[^>]*>',
-            re.DOTALL
-        )
+        if self.direction == 'both':
+            self.parse_both_directions()
+            return self.dataframe
+
+        self.dataframe = self._parse_direction(self.direction)
+        return self.dataframe
+
+    def parse_both_directions(self) -> tuple:
+        """
+        Parses the go and come stop lists from the same page load.
+
+        The page carries both div#GoDirectionRoute and div#BackDirectionRoute. The site
+        only fills in arrival_info of the visible direction, so the come block is read
+        from self.come_content when it is there; otherwise its arrival_info may be empty.
+
+        Returns:
+            tuple: (go DataFrame, come DataFrame). self.dataframe holds both concatenated.
+
+        Raises:
+            ValueError: If either direction has no data.
+        """
+        go_dataframe = self._parse_direction('go')
+        come_dataframe = self._parse_direction('come')
+        self.dataframe = pd.concat([go_dataframe, come_dataframe], ignore_index=True)
+        return go_dataframe, come_dataframe
+
+    @crawl_telemetry.timed('parse_route_info')
+    def _parse_direction(self, direction: str) -> pd.DataFrame:
+        """
+        Extracts the stops of one direction block of the page.
+
+        The parser backends read each page once and keep the stations of both directions.
+        """
+        source = 'come_content' if direction == 'come' and self.come_content is not None else 'content'
+        content = getattr(self, source)
+
+        if self.parser_backend == 'regex':
+            section = _direction_sections(content).get(direction, content)
+            matches = STOP_PATTERN.findall(section)
+        else:
+            if source not in self._parsed_stops:
+                self._parsed_stops[source] = parse_stops(content, self.parser_backend)
+            matches = stops_for_direction(self._parsed_stops[source], direction)
 
-        matches = pattern.findall(self.content)
         if not matches:
-            raise ValueError(f"No data found for route ID {self.route_id}")
+            raise ValueError(f"No data found for route ID {self.route_id} direction {direction}")
 
-        bus_routes = [m for m in matches]
-        self.dataframe = pd.DataFrame(
-            bus_routes,
+        dataframe = pd.DataFrame(
+            matches,
             columns=["arrival_info", "stop_number", "stop_name", "stop_id", "latitude", "longitude"]
-        )
+        ).astype(STOP_DTYPES)
 
-        self.dataframe["direction"] = self.direction
-        self.dataframe["route_id"] = self.route_id
+        decoded = decode_arrival_info(dataframe["arrival_info"])
+        dataframe["eta_seconds"] = decoded["eta_seconds"]
+        dataframe["arrival_status"] = decoded["arrival_status"]
+        dataframe["direction"] = pd.Categorical([direction] * len(dataframe), dtype=DIRECTION_DTYPE)
+        dataframe["route_id"] = pd.Categorical([self.route_id] * len(dataframe))
 
-        return self.dataframe
+        return dataframe
 
-    def save_to_database(self):
+    @crawl_telemetry.timed('save_to_database')
+    def save_to_database(self, history=None):
         """
-        Saves the parsed bus stop data to the SQLite database.
-        """
-        db_file = f"{self.working_directory}/hermes_ebus_taipei.sqlite3"
-        engine = create_engine(f"sqlite:///{db_file}")
-        Base = declarative_base()
-
-        class bus_stop_orm(Base):
-            __tablename__ = "data_route_info_busstop"
-            stop_id = Column(Integer)
-            arrival_info = Column(String)
-            stop_number = Column(Integer, primary_key=True)
-            stop_name = Column(String)
-            latitude = Column(Float)
-            longitude = Column(Float)
-            direction = Column(String, primary_key=True)
-            route_id = Column(String, primary_key=True)
-
-        Base.metadata.create_all(engine)
-        Session = sessionmaker(bind=engine)
-        session = Session()
-
-        for _, row in self.dataframe.iterrows():
-            session.merge(bus_stop_orm(
-                stop_id=row["stop_id"],
-                arrival_info=row["arrival_info"],
-                stop_number=row["stop_number"],
-                stop_name=row["stop_name"],
-                latitude=row["latitude"],
-                longitude=row["longitude"],
-                direction=row["direction"],
-                route_id=row["route_id"]
-            ))
+        Saves the parsed bus stop data to the SQLite database in one transaction.
+
+        Each route direction's static fields are fingerprinted. When the fingerprint matches
+        the one stored by the previous crawl, only the arrival columns (arrival_info and its
+        decoded eta_seconds and arrival_status) are updated; otherwise the stop rows are
+        written with one executemany upsert, their coordinates are copied into STOP_RTREE
+        and the new fingerprint is stored.
+        A direction whose arrival_info is empty throughout was not rendered by the site, so
+        its stored arrival columns are kept instead of being blanked.
+        self.static_changed maps each direction to whether its static fields were rewritten.
+
+        Args:
+            history (ArrivalHistoryStore): If given, the rendered arrivals are also appended
+                to it, since the database only keeps the latest ones.
+        """
+        session = get_session(self.working_directory)
+
+        self.static_changed = {}
+        rendered = []
+        for direction, dataframe in self.dataframe.groupby("direction", sort=False, observed=True):
+            fingerprint = route_fingerprint(dataframe)
+            stored = session.get(route_fingerprint_orm, (self.route_id, direction))
+            arrivals_rendered = bool((dataframe["arrival_info"].fillna('') != '').any())
+            if arrivals_rendered:
+                rendered.append(dataframe)
+
+            if stored is not None and stored.fingerprint == fingerprint:
+                self.static_changed[direction] = False
+                if not arrivals_rendered:
+                    continue
+                # Static fields unchanged: only the volatile arrival_info is written
+                session.execute(STOP_ARRIVAL_UPDATE, [
+                    {
+                        "b_route_id": self.route_id,
+                        "b_direction": direction,
+                        "b_stop_number": int(row["stop_number"]),
+                        "b_arrival_info": row["arrival_info"],
+                        "b_eta_seconds": row["eta_seconds"],
+                        "b_arrival_status": row["arrival_status"],
+                    }
+                    for row in _records(dataframe)
+                ])
+                continue
+
+            upsert = STOP_UPSERT if arrivals_rendered else STOP_STATIC_UPSERT
+            session.execute(upsert, _records(dataframe[STOP_COLUMNS]))
+            session.execute(STOP_RTREE_SYNC, {"route_id": self.route_id, "direction": direction})
+            session.execute(FINGERPRINT_UPSERT, {
+                "route_id": self.route_id, "direction": direction,
+                "fingerprint": fingerprint, "updated_at": datetime.now(),
+            })
+            self.static_changed[direction] = True
 
         session.commit()
         session.close()
 
+        if history is not None and rendered:
+            history.append(pd.concat(rendered, ignore_index=True))
+
 
 if __name__ == "__main__":
     # Initialize and process route data
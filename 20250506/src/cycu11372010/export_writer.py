@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+This module writes the all-routes export and the go/come side-by-side report route
+by route while a sweep runs, so memory stays flat and an interrupted sweep keeps the
+rows it already wrote.
+"""
+
+import codecs
+import csv
+import io
+import os
+import shutil
+
+import pandas as pd
+
+
+EXPORT_CHUNK_ROWS = 50000
+
+# Numeric columns of the stop exports; every other column (route_id, names, arrival text)
+# is read back as text, so IDs like 0161000900 keep their leading zeros
+EXPORT_DTYPES = {
+    'stop_number': 'Int64', 'stop_id': 'Int64', 'latitude': 'float64', 'longitude': 'float64',
+    'eta_seconds': 'Int64', 'arrival_status': 'Int64',
+}
+
+
+class StreamingExportWriter:
+    """
+    Appends each route's rows to a partial CSV file and turns it into the final CSV or XLSX at the end.
+
+    Next to the partial file a marker lists every route whose rows are complete, with the
+    file size after them. Reopening with resume=True cuts off rows of a route that was being
+    written when the process died and skips routes already in the file, so a resumed sweep
+    neither loses nor duplicates rows. The final file is only (re)written, atomically, by
+    finalize(); the partial file stays until a new sweep starts with resume=False.
+    """
+
+    def __init__(self, output_path: str, resume: bool = True, encoding: str = 'utf-8-sig',
+                 dtypes: dict = None):
+        """
+        Args:
+            output_path (str): Final export path; '.xlsx' exports to Excel, anything else to CSV.
+            resume (bool): Continue the partial file of an interrupted sweep instead of starting over.
+            encoding (str): Text encoding of the CSV.
+            dtypes (dict): Types of the numeric columns in an '.xlsx' export; defaults to
+                EXPORT_DTYPES, other columns are written as text.
+        """
+        self.output_path = output_path
+        self.dtypes = EXPORT_DTYPES if dtypes is None else dtypes
+        self.partial_path = f'{output_path}.partial.csv'
+        self.marker_path = f'{output_path}.routes'
+        self.encoding = encoding
+        # The BOM of utf-8-sig goes once at the start of the file, not before every appended route
+        self._row_encoding = 'utf-8' if codecs.lookup(encoding).name == 'utf-8-sig' else encoding
+        self.columns = None
+        self.done_routes = set()
+
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        committed_size = 0
+        if resume and os.path.exists(self.partial_path) and os.path.exists(self.marker_path):
+            with open(self.marker_path, 'r', encoding='utf-8') as marker:
+                for line in marker:
+                    route_id, size = line.rstrip('\n').split('\t')
+                    self.done_routes.add(route_id)
+                    committed_size = int(size)
+
+        if committed_size:
+            self._file = open(self.partial_path, 'r+b')
+            self._file.truncate(committed_size)
+            self._file.seek(committed_size)
+            with open(self.partial_path, 'r', encoding=self.encoding, newline='') as file:
+                self.columns = next(csv.reader(file))
+            self._marker = open(self.marker_path, 'a', encoding='utf-8')
+        else:
+            self.done_routes = set()
+            self._file = open(self.partial_path, 'wb')
+            if self._row_encoding != encoding:
+                self._file.write(codecs.BOM_UTF8)
+            self._marker = open(self.marker_path, 'w', encoding='utf-8')
+
+    def has_route(self, route_id: str) -> bool:
+        """
+        Returns:
+            bool: True if the route's rows are already in the export.
+        """
+        return route_id in self.done_routes
+
+    def write_route(self, route_id: str, frames: list):
+        """
+        Appends the rows of one route and records it in the marker once they are on disk.
+
+        Args:
+            route_id (str): The route the rows belong to.
+            frames (list): DataFrames of the route (e.g. go and come), all with the same columns.
+        """
+        if self.has_route(route_id) or not frames:
+            return
+
+        dataframe = pd.concat(frames, ignore_index=True)
+        header = self.columns is None
+        if header:
+            self.columns = list(dataframe.columns)
+
+        buffer = io.StringIO()
+        dataframe.reindex(columns=self.columns).to_csv(buffer, header=header, index=False)
+        self._file.write(buffer.getvalue().encode(self._row_encoding))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._marker.write(f'{route_id}\t{self._file.tell()}\n')
+        self._marker.flush()
+        self.done_routes.add(route_id)
+
+    def finalize(self) -> str:
+        """
+        Closes the writer and publishes every route written so far to output_path.
+
+        The export is written to a temporary file and renamed over output_path, so a crash
+        never leaves a truncated export behind.
+
+        Returns:
+            str: The output path, or None if no route was written.
+        """
+        self._file.close()
+        self._marker.close()
+        if self.columns is None:
+            return None
+
+        tmp_path = f'{self.output_path}.tmp'
+        if self.output_path.lower().endswith('.xlsx'):
+            self._write_xlsx(tmp_path)
+        else:
+            shutil.copyfile(self.partial_path, tmp_path)
+        os.replace(tmp_path, self.output_path)
+        return self.output_path
+
+    def _write_xlsx(self, path: str):
+        """
+        Converts the partial CSV to Excel in chunks with a write-only workbook.
+
+        Columns in self.dtypes become numeric cells, with missing values as empty cells;
+        the others stay text.
+        """
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Sheet1')
+        sheet.append(self.columns)
+        dtypes = {column: self.dtypes.get(column, str) for column in self.columns}
+        na_values = {column: [''] for column in self.columns if column in self.dtypes}
+        for chunk in pd.read_csv(self.partial_path, encoding=self.encoding, chunksize=EXPORT_CHUNK_ROWS,
+                                 dtype=dtypes, keep_default_na=False, na_values=na_values):
+            for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+                sheet.append(list(row))
+        workbook.save(path)
+
+
+class SideBySideReportWriter:
+    """
+    Writes the go/come side-by-side report one route block at a time.
+
+    Each block is a row with the route name and ID, then the go and come stops next to
+    each other (the shorter direction padded with empty cells), then an empty spacer row,
+    under a single go_*/come_* header row. '.xlsx' output goes through a write-only
+    openpyxl workbook, which streams rows to a temporary file, so memory stays at one
+    route; any other extension is written as CSV.
+    """
+
+    def __init__(self, output_path: str, columns: list, encoding: str = 'utf-8-sig'):
+        """
+        Args:
+            output_path (str): Report path; '.xlsx' writes Excel, anything else CSV.
+            columns (list): Stop columns shown for each direction; the first is the sort key.
+            encoding (str): Text encoding of a CSV report.
+        """
+        self.output_path = output_path
+        self.columns = list(columns)
+        self.tmp_path = f'{output_path}.tmp'
+        self.routes = 0
+
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        header = [f'go_{column}' for column in self.columns] + [f'come_{column}' for column in self.columns]
+        if output_path.lower().endswith('.xlsx'):
+            from openpyxl import Workbook
+
+            self._workbook = Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet('Sheet1')
+            self._append = self._sheet.append
+            self._file = None
+        else:
+            self._workbook = None
+            self._file = open(self.tmp_path, 'w', encoding=encoding, newline='')
+            csv_writer = csv.writer(self._file, lineterminator='\n')
+            self._append = lambda row: csv_writer.writerow(['' if cell is None else cell for cell in row])
+        self._append(header)
+
+    def _rows(self, dataframe: pd.DataFrame) -> list:
+        dataframe = dataframe[self.columns].sort_values(by=self.columns[0])
+        return dataframe.astype(object).where(dataframe.notna(), None).values.tolist()
+
+    def write_route(self, route_name: str, route_id: str, go: pd.DataFrame, come: pd.DataFrame):
+        """
+        Appends the block of one route.
+
+        Args:
+            route_name (str): Route name shown in the block's first row.
+            route_id (str): Route ID shown next to it.
+            go (pd.DataFrame): Stops of the go direction.
+            come (pd.DataFrame): Stops of the come direction.
+        """
+        width = len(self.columns)
+        go_rows, come_rows = self._rows(go), self._rows(come)
+        padding = [None] * width
+
+        self._append([route_name, route_id] + [None] * (2 * width - 2))
+        for index in range(max(len(go_rows), len(come_rows))):
+            self._append((go_rows[index] if index < len(go_rows) else padding) +
+                         (come_rows[index] if index < len(come_rows) else padding))
+        self._append([None] * (2 * width))
+        if self._file is not None:
+            self._file.flush()
+        self.routes += 1
+
+    def finalize(self) -> str:
+        """
+        Finishes the report and moves it to output_path in one rename.
+
+        Returns:
+            str: The output path, or None if no route was written.
+        """
+        if self._workbook is not None:
+            self._workbook.save(self.tmp_path)
+        else:
+            self._file.close()
+        if not self.routes:
+            os.remove(self.tmp_path)
+            return None
+        os.replace(self.tmp_path, self.output_path)
+        return self.output_path
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+This module serves recorded ebus pages from a local HTTP server, with optional
+latency and error injection, so sweeps can be benchmarked without the live site.
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cycu11372010.snapshot_cache import SnapshotCache
+
+
+LIVE_BASE_URL = 'https://ebus.gov.taipei'
+
+
+class FixtureServer:
+    """
+    Replays the route list page and recorded StopsOfRoute pages over HTTP.
+
+    StopsOfRoute pages come from <fixture_directory>/StopsOfRoute_<route_id>.html if present,
+    otherwise from the newest snapshot of the live URL in the snapshot cache (any age).
+    Pass base_url to taipei_route_list, taipei_route_info or crawl_routes, or set
+    EBUS_BASE_URL, to crawl against it.
+    """
+
+    def __init__(self, route_list_file: str = 'data/hermes_ebus_taipei_route_list.html',
+                 snapshot_directory: str = 'data/snapshots', fixture_directory: str = None,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 seed: int = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            route_list_file (str): Recorded all-routes page served at /ebus.
+            snapshot_directory (str): Snapshot cache holding recorded StopsOfRoute pages.
+            fixture_directory (str): Optional directory of StopsOfRoute_<route_id>.html files.
+            latency (float): Seconds every response is delayed.
+            jitter (float): Extra random delay of up to this many seconds.
+            error_rate (float): Fraction of requests answered with error_status instead of the page.
+            error_status (int): HTTP status of injected errors.
+            seed (int): Seed of the latency/error random generator, for repeatable runs.
+            host (str): Interface to listen on.
+            port (int): Port to listen on; 0 picks a free one.
+        """
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("error_rate must be between 0 and 1")
+
+        self.route_list_file = route_list_file
+        self.snapshot_cache = SnapshotCache(snapshot_directory, ttl_seconds=None)
+        self.fixture_directory = fixture_directory
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.host = host
+        self.port = port
+
+        self.stats = {"requests": 0, "served": 0, "errors": 0, "not_found": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """
+        Returns:
+            str: Root URL of the running server, to use as base_url.
+        """
+        return f'http://{self.host}:{self.port}'
+
+    def lookup(self, path: str, query: dict) -> str:
+        """
+        Finds the recorded page for a request.
+
+        Args:
+            path (str): Request path, e.g. '/Route/StopsOfRoute'.
+            query (dict): Parsed query string.
+
+        Returns:
+            str: The page HTML, or None if nothing was recorded for it.
+        """
+        if path == '/ebus':
+            if not os.path.exists(self.route_list_file):
+                return None
+            with open(self.route_list_file, 'r', encoding='utf-8') as file:
+                return file.read()
+
+        if path == '/Route/StopsOfRoute':
+            route_id = query.get('routeid', [''])[0]
+            if self.fixture_directory is not None:
+                fixture_path = os.path.join(self.fixture_directory, f'StopsOfRoute_{route_id}.html')
+                if os.path.exists(fixture_path):
+                    with open(fixture_path, 'r', encoding='utf-8') as file:
+                        return file.read()
+
+            live_url = f'{LIVE_BASE_URL}/Route/StopsOfRoute?routeid={route_id}'
+            for direction in ['both', 'go', 'come']:
+                content = self.snapshot_cache.get(live_url, direction)
+                if content is not None:
+                    return content
+        return None
+
+    def _plan_response(self) -> tuple:
+        """
+        Draws the delay and whether to inject an error for one request.
+
+        Returns:
+            tuple: (delay in seconds, inject error)
+        """
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self._random.random() < self.error_rate
+        return delay, fail
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _make_handler(self):
+        server = self
+
+        class fixture_handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._count("requests")
+                delay, fail = server._plan_response()
+                if delay:
+                    time.sleep(delay)
+
+                url = urlparse(self.path)
+                content = None if fail else server.lookup(url.path, parse_qs(url.query))
+                if fail:
+                    server._count("errors")
+                    self.send_error(server.error_status)
+                    return
+                if content is None:
+                    server._count("not_found")
+                    self.send_error(404)
+                    return
+
+                body = content.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                server._count("served")
+
+            def log_message(self, format, *args):
+                pass
+
+        return fixture_handler
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+
+        Returns:
+            FixtureServer: self, with port set to the bound port.
+        """
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server and waits for its thread.
+        """
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve recorded ebus pages locally.')
+    parser.add_argument('--route-list-file', default='data/hermes_ebus_taipei_route_list.html')
+    parser.add_argument('--snapshot-directory', default='data/snapshots')
+    parser.add_argument('--fixture-directory', default=None)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    with FixtureServer(args.route_list_file, args.snapshot_directory, args.fixture_directory,
+                       latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       seed=args.seed, port=args.port) as fixture_server:
+        print(f"Serving recorded pages at {fixture_server.base_url} (set EBUS_BASE_URL to use it)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        print(fixture_server.stats)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+This module fetches server-rendered pages over plain HTTP with one shared,
+keep-alive, compression-enabled requests session.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+HTTP_TIMEOUT = 10
+HTTP_POOL_SIZE = 8
+
+_session = None
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the process-wide HTTP session, creating it on first use.
+
+    Connections are kept alive and pooled per host, and responses are requested
+    gzip/deflate compressed.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=1)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+        _session.headers.update({
+            'Accept': 'text/html,application/xhtml+xml',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+    return _session
+
+
+def fetch_html(url: str, timeout: float = HTTP_TIMEOUT) -> str:
+    """
+    Downloads a page with the shared session.
+
+    Args:
+        url (str): Page to download.
+        timeout (float): Seconds to wait for the server.
+
+    Returns:
+        str: The decoded HTML.
+
+    Raises:
+        requests.RequestException: On connection problems or a non-2xx status.
+    """
+    response = get_http_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    # requests falls back to ISO-8859-1 for text/html without a charset; the site serves UTF-8
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        response.encoding = 'utf-8'
+    return response.text
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+This module replaces fixed render sleeps with waits that resolve as soon as the
+station list is on the page, and records how long each page took to get ready.
+"""
+
+import asyncio
+import time
+
+import pandas as pd
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+
+READY_TIMEOUT_MS = 10000
+REREAD_INTERVAL_MS = 200
+
+# Column types of the observations; set explicitly so an empty log still summarizes
+READINESS_DTYPES = {"label": object, "elapsed_ms": "float64", "timed_out": "bool"}
+
+
+class ReadinessLog:
+    """
+    Collects observed page readiness times so the timeout ceiling can be tuned.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, label: str, elapsed_ms: float, timed_out: bool = False):
+        """
+        Stores one observation.
+
+        Args:
+            label (str): Kind of page, e.g. 'route_list' or 'route_info_go'.
+            elapsed_ms (float): Milliseconds from navigation until the page was ready.
+            timed_out (bool): Whether the ceiling was hit before the page became ready.
+        """
+        self.records.append({"label": label, "elapsed_ms": elapsed_ms, "timed_out": timed_out})
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: One row per observation.
+        """
+        return pd.DataFrame(self.records, columns=list(READINESS_DTYPES)).astype(READINESS_DTYPES)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summarizes readiness times per page kind.
+
+        Returns:
+            pd.DataFrame: count, median, p95, max and timeouts per label.
+        """
+        dataframe = self.to_dataframe()
+        grouped = dataframe.groupby("label")
+        return pd.DataFrame({
+            "count": grouped["elapsed_ms"].count(),
+            "median_ms": grouped["elapsed_ms"].median(),
+            "p95_ms": grouped["elapsed_ms"].quantile(0.95),
+            "max_ms": grouped["elapsed_ms"].max(),
+            "timeouts": grouped["timed_out"].sum(),
+        })
+
+    def save(self, csv_path: str):
+        """
+        Writes every observation to a CSV file.
+
+        Args:
+            csv_path (str): Destination file.
+        """
+        self.to_dataframe().to_csv(csv_path, index=False)
+
+
+page_readiness = ReadinessLog()
+
+
+def _ready_script(selector: str, require_text: bool) -> str:
+    if require_text:
+        return (
+            "sel => Array.from(document.querySelectorAll(sel))"
+            ".some(el => el.textContent.trim() !== '')"
+        )
+    return "sel => document.querySelector(sel) !== null"
+
+
+def wait_until_ready(page, selector: str, label: str, timeout_ms: int = READY_TIMEOUT_MS,
+                     require_text: bool = False) -> bool:
+    """
+    Waits until the selector is on the page (and non-empty if require_text), at most timeout_ms.
+
+    Args:
+        page (playwright.sync_api.Page): Page that has just navigated.
+        selector (str): CSS selector that marks the page as rendered.
+        label (str): Kind of page, used for the readiness log.
+        timeout_ms (int): Ceiling for the wait.
+        require_text (bool): Also require one matched element to contain text.
+
+    Returns:
+        bool: True if the page became ready, False if the ceiling was hit.
+    """
+    start = time.perf_counter()
+    try:
+        page.wait_for_function(_ready_script(selector, require_text), arg=selector, timeout=timeout_ms)
+        ready = True
+    except PlaywrightTimeoutError:
+        ready = False
+    page_readiness.record(label, (time.perf_counter() - start) * 1000, timed_out=not ready)
+    return ready
+
+
+def read_until(page, has_data, timeout_ms: int = READY_TIMEOUT_MS) -> str:
+    """
+    Reads page.content() and re-reads it until has_data accepts it or timeout_ms passes.
+
+    Args:
+        page (playwright.sync_api.Page): The rendered page.
+        has_data (callable): Takes the HTML and returns True when it can be parsed.
+        timeout_ms (int): Ceiling for re-reading.
+
+    Returns:
+        str: The last HTML read, parseable or not.
+    """
+    deadline = time.perf_counter() + timeout_ms / 1000
+    content = page.content()
+    while not has_data(content) and time.perf_counter() < deadline:
+        page.wait_for_timeout(REREAD_INTERVAL_MS)
+        content = page.content()
+    return content
+
+
+async def async_wait_until_ready(page, selector: str, label: str, timeout_ms: int = READY_TIMEOUT_MS,
+                                 require_text: bool = False) -> bool:
+    """
+    Async counterpart of wait_until_ready for playwright.async_api pages.
+    """
+    start = time.perf_counter()
+    try:
+        await page.wait_for_function(_ready_script(selector, require_text), arg=selector, timeout=timeout_ms)
+        ready = True
+    except PlaywrightTimeoutError:
+        ready = False
+    page_readiness.record(label, (time.perf_counter() - start) * 1000, timed_out=not ready)
+    return ready
+
+
+async def async_read_until(page, has_data, timeout_ms: int = READY_TIMEOUT_MS) -> str:
+    """
+    Async counterpart of read_until for playwright.async_api pages.
+    """
+    deadline = time.perf_counter() + timeout_ms / 1000
+    content = await page.content()
+    while not has_data(content) and time.perf_counter() < deadline:
+        await asyncio.sleep(REREAD_INTERVAL_MS / 1000)
+        content = await page.content()
+    return content
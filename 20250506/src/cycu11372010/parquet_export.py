@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+This module exports the stop table as a compressed Parquet dataset partitioned by
+crawl date and route, so readers get typed columns and can load a single route
+without scanning the others. pyarrow is imported only when it is used.
+"""
+
+import os
+from datetime import date
+
+import pandas as pd
+
+from cycu11372010.ebus_taipei import DIRECTION_DTYPE, STOP_DTYPES, get_engine
+
+
+# Stored types of the columns that are nullable in SQLite
+NULLABLE_DTYPES = {'eta_seconds': 'Int32', 'arrival_status': 'Int8'}
+
+STOP_PARTITIONS = ('crawl_date', 'route_id')
+
+
+def read_stop_table(working_directory: str = 'data') -> pd.DataFrame:
+    """
+    Returns:
+        pd.DataFrame: Every row of data_route_info_busstop with the same types as parsed stops.
+    """
+    with get_engine(working_directory).connect() as connection:
+        dataframe = pd.read_sql('SELECT * FROM data_route_info_busstop', connection)
+    dataframe = dataframe.astype({**STOP_DTYPES, **NULLABLE_DTYPES})
+    dataframe['direction'] = dataframe['direction'].astype(DIRECTION_DTYPE)
+    return dataframe
+
+
+def _partitioning(partition_cols: tuple):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # Explicit string types, otherwise route IDs like 0161000900 are read back as integers
+    return ds.partitioning(pa.schema([(column, pa.string()) for column in partition_cols]), flavor='hive')
+
+
+def export_stops_parquet(working_directory: str = 'data', output_directory: str = None, dataframe: pd.DataFrame = None,
+                         crawl_date: str = None, partition_cols: tuple = STOP_PARTITIONS,
+                         compression: str = 'zstd') -> str:
+    """
+    Writes the stop table as a hive-partitioned Parquet dataset.
+
+    Partitions being written replace the ones already there (e.g. re-exporting the same day),
+    other partitions are kept, so exports of earlier days stay readable side by side.
+
+    Args:
+        working_directory (str): Directory holding the SQLite database.
+        output_directory (str): Dataset root; defaults to <working_directory>/stops_parquet.
+        dataframe (pd.DataFrame): Stops to export; defaults to read_stop_table().
+        crawl_date (str): Value of the crawl_date partition; defaults to today (YYYY-MM-DD).
+        partition_cols (tuple): Columns to partition by, outermost first.
+        compression (str): Parquet compression codec.
+
+    Returns:
+        str: The dataset root.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    output_directory = output_directory or os.path.join(working_directory, 'stops_parquet')
+    if dataframe is None:
+        dataframe = read_stop_table(working_directory)
+
+    dataframe = dataframe.assign(crawl_date=crawl_date or date.today().isoformat())
+    for column in partition_cols:
+        dataframe[column] = dataframe[column].astype(str)
+
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    ds.write_dataset(
+        table, output_directory, format='parquet',
+        partitioning=_partitioning(partition_cols),
+        file_options=ds.ParquetFileFormat().make_write_options(compression=compression),
+        existing_data_behavior='delete_matching',
+        basename_template='stops-{i}.parquet',
+    )
+    # Keep a copy of the schema so readers see the column types even for an empty filter result
+    pq.write_metadata(table.schema, os.path.join(output_directory, '_common_metadata'))
+    return output_directory
+
+
+def read_stops_parquet(dataset_directory: str, route_ids: list = None, crawl_dates: list = None,
+                       columns: list = None, partition_cols: tuple = STOP_PARTITIONS) -> pd.DataFrame:
+    """
+    Reads stops back from an export, opening only the partitions that match the filters.
+
+    Args:
+        dataset_directory (str): Dataset root written by export_stops_parquet.
+        route_ids (list): Only these routes; None reads all.
+        crawl_dates (list): Only these crawl dates (YYYY-MM-DD); None reads all.
+        columns (list): Columns to load; None loads all.
+        partition_cols (tuple): Partitioning used when writing.
+
+    Returns:
+        pd.DataFrame: The matching stop rows.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(dataset_directory, format='parquet', partitioning=_partitioning(partition_cols),
+                         exclude_invalid_files=True)
+    conditions = []
+    if route_ids is not None:
+        conditions.append(ds.field('route_id').isin([str(route_id) for route_id in route_ids]))
+    if crawl_dates is not None:
+        conditions.append(ds.field('crawl_date').isin([str(crawl_date) for crawl_date in crawl_dates]))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
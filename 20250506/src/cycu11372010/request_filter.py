@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+This module provides a page-setup hook that aborts requests the scrapers never
+parse (images, fonts, map tiles, analytics) through Playwright route interception.
+"""
+
+from urllib.parse import urlparse
+
+
+# Scripts and XHR stay allowed: the station list and arrival times are filled in by the site's JS.
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('image', 'font', 'media', 'stylesheet')
+
+DEFAULT_BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'facebook.net',
+    'maps.googleapis.com',
+    'maps.gstatic.com',
+    'tile.openstreetmap.org',
+    'api.mapbox.com',
+    'tiles.mapbox.com',
+)
+
+
+class RequestFilter:
+    """
+    Decides which requests a scraping page may make and installs itself on pages.
+    """
+
+    def __init__(self, blocked_resource_types: tuple = DEFAULT_BLOCKED_RESOURCE_TYPES,
+                 blocked_hosts: tuple = DEFAULT_BLOCKED_HOSTS):
+        """
+        Args:
+            blocked_resource_types (tuple): Playwright resource types to abort, e.g. 'image'.
+            blocked_hosts (tuple): Hosts (and their subdomains) whose requests are aborted.
+        """
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self.blocked_hosts = tuple(blocked_hosts)
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        """
+        Args:
+            resource_type (str): Playwright request.resource_type.
+            url (str): Request URL.
+
+        Returns:
+            bool: True if the request should be aborted.
+        """
+        if resource_type == 'document':
+            return False
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = urlparse(url).hostname or ''
+        return any(host == blocked or host.endswith('.' + blocked) for blocked in self.blocked_hosts)
+
+    def install(self, page):
+        """
+        Installs the filter on a playwright.sync_api page (or browser context).
+        """
+        def handle(route):
+            if self.should_block(route.request.resource_type, route.request.url):
+                route.abort()
+            else:
+                route.continue_()
+
+        page.route('**/*', handle)
+
+    async def install_async(self, page):
+        """
+        Installs the filter on a playwright.async_api page (or browser context).
+        """
+        async def handle(route):
+            if self.should_block(route.request.resource_type, route.request.url):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await page.route('**/*', handle)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+This module stores route shapes as WKB in the SQLite database, next to
+data_route_info_busstop, with an R-tree index on their bounding boxes, so maps and
+spatial queries load geometries without re-parsing WKT.
+"""
+
+import pandas as pd
+import shapely
+from sqlalchemy import bindparam, text
+
+from cycu11372010.ebus_taipei import get_engine
+
+
+SHAPE_TABLE = 'data_route_shape'
+SHAPE_RTREE = 'data_route_shape_rtree'
+
+SCHEMA_SQL = [
+    f'CREATE TABLE IF NOT EXISTS {SHAPE_TABLE} ('
+    'shape_id INTEGER PRIMARY KEY, route_id TEXT NOT NULL, wkt_id TEXT NOT NULL, geometry BLOB NOT NULL, '
+    'UNIQUE (route_id, wkt_id))',
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {SHAPE_RTREE} USING rtree(shape_id, min_x, max_x, min_y, max_y)',
+]
+
+
+class RouteShapeStore:
+    """
+    Route shapes (WGS84 LineStrings from parse_wkt_fields) stored as WKB with an R-tree on their bounds.
+
+    data_route_shape holds one row per (route_id, wkt_id); data_route_shape_rtree shares its
+    shape_id, so a bounding-box query is an R-tree lookup joined back to the WKB.
+    """
+
+    def __init__(self, working_directory: str = 'data'):
+        """
+        Args:
+            working_directory (str): Directory holding the SQLite database.
+        """
+        self.working_directory = working_directory
+        self.engine = get_engine(self.working_directory)
+        with self.engine.begin() as connection:
+            for statement in SCHEMA_SQL:
+                connection.execute(text(statement))
+
+    def save_shapes(self, wkt_df: pd.DataFrame):
+        """
+        Replaces the shapes of the routes in wkt_df, in one transaction.
+
+        The WKT strings are parsed once, with a single vectorized call.
+
+        Args:
+            wkt_df (pd.DataFrame): route_id, wkt_id and wkt_string columns, e.g. from collect_route_wkt.
+        """
+        if wkt_df.empty:
+            return
+        geometries = shapely.from_wkt(wkt_df['wkt_string'].to_numpy())
+        bounds = shapely.bounds(geometries)
+        blobs = shapely.to_wkb(geometries)
+        route_ids = wkt_df['route_id'].astype(str).tolist()
+
+        with self.engine.begin() as connection:
+            old_routes = [{"route_id": route_id} for route_id in set(route_ids)]
+            if old_routes:
+                connection.execute(text(
+                    f'DELETE FROM {SHAPE_RTREE} WHERE shape_id IN '
+                    f'(SELECT shape_id FROM {SHAPE_TABLE} WHERE route_id = :route_id)'), old_routes)
+                connection.execute(text(f'DELETE FROM {SHAPE_TABLE} WHERE route_id = :route_id'), old_routes)
+
+            next_id = connection.execute(text(f'SELECT COALESCE(MAX(shape_id), 0) + 1 FROM {SHAPE_TABLE}')).scalar()
+            shape_ids = range(next_id, next_id + len(wkt_df))
+            connection.execute(text(
+                f'INSERT INTO {SHAPE_TABLE} (shape_id, route_id, wkt_id, geometry) '
+                'VALUES (:shape_id, :route_id, :wkt_id, :geometry)'), [
+                {"shape_id": shape_id, "route_id": route_id, "wkt_id": str(wkt_id), "geometry": blob}
+                for shape_id, route_id, wkt_id, blob in zip(shape_ids, route_ids, wkt_df['wkt_id'], blobs)
+            ])
+            connection.execute(text(
+                f'INSERT INTO {SHAPE_RTREE} (shape_id, min_x, max_x, min_y, max_y) '
+                'VALUES (:shape_id, :min_x, :max_x, :min_y, :max_y)'), [
+                {"shape_id": shape_id, "min_x": box[0], "max_x": box[2], "min_y": box[1], "max_y": box[3]}
+                for shape_id, box in zip(shape_ids, bounds.tolist())
+            ])
+
+    def _read(self, query, params: dict = None) -> pd.DataFrame:
+        with self.engine.connect() as connection:
+            dataframe = pd.read_sql(query, connection, params=params)
+        dataframe['geometry'] = shapely.from_wkb(dataframe['geometry'].to_numpy())
+        return dataframe
+
+    def load_shapes(self, route_ids: list = None) -> pd.DataFrame:
+        """
+        Loads stored shapes, decoding all WKB blobs in one vectorized call.
+
+        Args:
+            route_ids (list): Routes to load; None loads every route.
+
+        Returns:
+            pd.DataFrame: route_id, wkt_id and a shapely geometry column; wrap it with
+                gpd.GeoDataFrame(..., crs='EPSG:4326') for plotting.
+        """
+        query = f'SELECT route_id, wkt_id, geometry FROM {SHAPE_TABLE}'
+        if route_ids is None:
+            return self._read(text(query + ' ORDER BY shape_id'))
+        return self._read(
+            text(query + ' WHERE route_id IN :route_ids ORDER BY shape_id').bindparams(
+                bindparam("route_ids", expanding=True)),
+            {"route_ids": [str(route_id) for route_id in route_ids]},
+        )
+
+    def query_bbox(self, min_x: float, min_y: float, max_x: float, max_y: float, exact: bool = True) -> pd.DataFrame:
+        """
+        Finds the shapes that intersect a longitude/latitude box, using the R-tree.
+
+        Args:
+            min_x, min_y, max_x, max_y (float): The box in WGS84 degrees.
+            exact (bool): Also drop shapes whose bounding box overlaps but whose line does not.
+
+        Returns:
+            pd.DataFrame: Same columns as load_shapes.
+        """
+        dataframe = self._read(text(
+            f'SELECT s.route_id, s.wkt_id, s.geometry FROM {SHAPE_RTREE} r '
+            f'JOIN {SHAPE_TABLE} s ON s.shape_id = r.shape_id '
+            'WHERE r.max_x >= :min_x AND r.min_x <= :max_x AND r.max_y >= :min_y AND r.min_y <= :max_y '
+            'ORDER BY s.shape_id'),
+            {"min_x": min_x, "min_y": min_y, "max_x": max_x, "max_y": max_y},
+        )
+        if exact and not dataframe.empty:
+            box = shapely.box(min_x, min_y, max_x, max_y)
+            dataframe = dataframe[shapely.intersects(dataframe['geometry'].to_numpy(), box)].reset_index(drop=True)
+        return dataframe
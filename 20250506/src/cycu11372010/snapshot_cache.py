@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+This module keeps gzip-compressed snapshots of fetched route pages on disk so
+they can be parsed again offline without re-rendering them.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import time
+
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+class SnapshotCache:
+    """
+    Content-addressed page store with a per-(url, direction) history and a TTL.
+
+    Page bodies live once under blobs/ named by their SHA-256, so an unchanged page
+    costs no extra disk. refs/ holds one JSON file per (url, direction) listing the
+    snapshots taken with their timestamps. put() only forgets expired entries; their
+    bodies stay on disk until purge_expired() runs, which the crawls do once they finish,
+    while no other writer can be between storing a body and its entry.
+    """
+
+    def __init__(self, cache_directory: str = 'data/snapshots', ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        """
+        Args:
+            cache_directory (str): Root directory of the cache.
+            ttl_seconds (float): Age after which a snapshot counts as expired; None keeps them forever.
+        """
+        self.cache_directory = cache_directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.join(cache_directory, 'blobs'), exist_ok=True)
+        os.makedirs(os.path.join(cache_directory, 'refs'), exist_ok=True)
+
+    @staticmethod
+    def key(url: str, direction: str) -> str:
+        """
+        Returns:
+            str: Stable identifier of a (url, direction) pair.
+        """
+        return hashlib.sha1(f'{direction}|{url}'.encode('utf-8')).hexdigest()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_directory, 'blobs', digest[:2], f'{digest}.html.gz')
+
+    def _ref_path(self, url: str, direction: str) -> str:
+        return os.path.join(self.cache_directory, 'refs', f'{self.key(url, direction)}.json')
+
+    def _read_ref(self, url: str, direction: str) -> dict:
+        ref_path = self._ref_path(url, direction)
+        if not os.path.exists(ref_path):
+            return {"url": url, "direction": direction, "snapshots": []}
+        with open(ref_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return self.ttl_seconds is None or time.time() - fetched_at <= self.ttl_seconds
+
+    def put(self, url: str, direction: str, content: str, fetched_at: float = None) -> str:
+        """
+        Stores a page snapshot.
+
+        Args:
+            url (str): URL the page was fetched from.
+            direction (str): Direction the page was rendered for.
+            content (str): Page HTML.
+            fetched_at (float): Unix timestamp of the fetch; defaults to now.
+
+        Returns:
+            str: Path of the compressed page body.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            self._write_atomic(blob_path, gzip.compress(data))
+
+        ref = self._read_ref(url, direction)
+        ref["snapshots"].append({"fetched_at": fetched_at, "sha256": digest})
+        ref["snapshots"] = [s for s in ref["snapshots"] if self._is_fresh(s["fetched_at"])] or ref["snapshots"][-1:]
+        self._write_atomic(self._ref_path(url, direction), json.dumps(ref, ensure_ascii=False).encode('utf-8'))
+        return blob_path
+
+    def latest(self, url: str, direction: str) -> dict:
+        """
+        Returns:
+            dict: The newest non-expired snapshot entry ('fetched_at', 'sha256'), or None.
+        """
+        snapshots = self._read_ref(url, direction)["snapshots"]
+        if not snapshots:
+            return None
+        newest = max(snapshots, key=lambda s: s["fetched_at"])
+        return newest if self._is_fresh(newest["fetched_at"]) else None
+
+    def get(self, url: str, direction: str) -> str:
+        """
+        Reads the newest non-expired snapshot.
+
+        Args:
+            url (str): URL the page was fetched from.
+            direction (str): Direction the page was rendered for.
+
+        Returns:
+            str: The page HTML, or None if there is no fresh snapshot.
+        """
+        entry = self.latest(url, direction)
+        if entry is None:
+            return None
+        with gzip.open(self._blob_path(entry["sha256"]), 'rb') as file:
+            return file.read().decode('utf-8')
+
+    def purge_expired(self) -> int:
+        """
+        Drops expired snapshot entries and deletes page bodies no entry points to any more.
+
+        Returns:
+            int: Number of page bodies deleted.
+        """
+        refs_directory = os.path.join(self.cache_directory, 'refs')
+        referenced = set()
+        for name in os.listdir(refs_directory):
+            ref_path = os.path.join(refs_directory, name)
+            with open(ref_path, 'r', encoding='utf-8') as file:
+                ref = json.load(file)
+            ref["snapshots"] = [s for s in ref["snapshots"] if self._is_fresh(s["fetched_at"])]
+            if ref["snapshots"]:
+                self._write_atomic(ref_path, json.dumps(ref, ensure_ascii=False).encode('utf-8'))
+                referenced.update(s["sha256"] for s in ref["snapshots"])
+            else:
+                os.remove(ref_path)
+
+        removed = 0
+        blobs_directory = os.path.join(self.cache_directory, 'blobs')
+        for prefix in os.listdir(blobs_directory):
+            for name in os.listdir(os.path.join(blobs_directory, prefix)):
+                if name.split('.')[0] not in referenced:
+                    os.remove(os.path.join(blobs_directory, prefix, name))
+                    removed += 1
+        return removed
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+This module times the crawl stages (fetch, parse, store, flag) per route and
+exports the results as a Prometheus textfile and a JSON summary.
+"""
+
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = 'ebus_crawl'
+
+# Column types of the records; set explicitly so a run without records still summarizes
+RECORD_DTYPES = {"stage": object, "route_id": object, "elapsed_ms": "float64", "bytes": "int64",
+                 "retries": "int64", "ok": "bool"}
+
+
+class CrawlTelemetry:
+    """
+    Collects one record per executed stage: route, latency, bytes fetched, retries and success.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.started_at = time.time()
+
+    def record(self, stage: str, elapsed_ms: float, route_id: str = None, nbytes: int = 0,
+               retries: int = 0, ok: bool = True):
+        """
+        Stores one observation.
+
+        Args:
+            stage (str): Stage name, e.g. 'fetch_browser' or 'save_to_database'.
+            elapsed_ms (float): Milliseconds the stage took.
+            route_id (str): Route the stage worked on, None for the route list.
+            nbytes (int): Bytes downloaded by the stage.
+            retries (int): Extra attempts the stage needed, e.g. a browser fetch after the HTTP fast path missed.
+            ok (bool): False if the stage failed.
+        """
+        self.records.append({
+            "stage": stage, "route_id": route_id, "elapsed_ms": elapsed_ms,
+            "bytes": nbytes, "retries": retries, "ok": ok,
+        })
+
+    @contextmanager
+    def stage(self, name: str, route_id: str = None):
+        """
+        Times the enclosed block as one stage; an exception is recorded as a failure and re-raised.
+
+        Yields:
+            dict: Mutable extras for the record; set 'bytes' and 'retries' inside the block, or
+                'ok' to False for a failure that is handled without raising.
+        """
+        extras = {"bytes": 0, "retries": 0, "ok": True}
+        start = time.perf_counter()
+        completed = False
+        try:
+            yield extras
+            completed = True
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, route_id=route_id,
+                        nbytes=extras["bytes"], retries=extras["retries"], ok=completed and extras["ok"])
+
+    def timed(self, name: str, bytes_attr: str = None):
+        """
+        Decorates a scraper method so every call is recorded as the given stage.
+
+        The route is taken from self.route_id, else from the route_id keyword or the first
+        positional argument.
+
+        Args:
+            name (str): Stage name.
+            bytes_attr (str): Attribute holding the fetched HTML after the call, counted as bytes.
+        """
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapper(obj, *args, **kwargs):
+                route_id = getattr(obj, 'route_id', None)
+                if route_id is None:
+                    route_id = kwargs.get('route_id', args[0] if args else None)
+                with self.stage(name, route_id) as extras:
+                    result = method(obj, *args, **kwargs)
+                    if bytes_attr is not None:
+                        extras["bytes"] = len((getattr(obj, bytes_attr) or '').encode('utf-8'))
+                return result
+            return wrapper
+        return decorator
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: One row per observation.
+        """
+        return pd.DataFrame(self.records, columns=list(RECORD_DTYPES)).astype(RECORD_DTYPES)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summarizes every stage.
+
+        Returns:
+            pd.DataFrame: count, failures, retries, bytes, p50/p95/p99 and max latency per stage.
+        """
+        dataframe = self.to_dataframe()
+        dataframe["failed"] = ~dataframe["ok"].astype(bool)
+        grouped = dataframe.groupby("stage")
+        summary = pd.DataFrame({
+            "count": grouped["elapsed_ms"].count(),
+            "failures": grouped["failed"].sum(),
+            "retries": grouped["retries"].sum(),
+            "bytes": grouped["bytes"].sum(),
+            "total_ms": grouped["elapsed_ms"].sum(),
+        })
+        for q in QUANTILES:
+            summary[f"p{int(q * 100)}_ms"] = grouped["elapsed_ms"].quantile(q)
+        summary["max_ms"] = grouped["elapsed_ms"].max()
+        return summary
+
+    def save(self, csv_path: str):
+        """
+        Writes every observation (the per-route latencies) to a CSV file.
+
+        Args:
+            csv_path (str): Destination file.
+        """
+        self.to_dataframe().to_csv(csv_path, index=False)
+
+    def write_json_summary(self, json_path: str):
+        """
+        Writes the per-stage summary with the run's wall time and route count as JSON.
+
+        Args:
+            json_path (str): Destination file.
+        """
+        dataframe = self.to_dataframe()
+        summary = {
+            "started_at": self.started_at,
+            "wall_seconds": time.time() - self.started_at,
+            "routes": int(dataframe["route_id"].nunique()),
+            "stages": json.loads(self.summary().to_json(orient="index")),
+        }
+        _write_atomic(json_path, json.dumps(summary, ensure_ascii=False, indent=2))
+
+    def write_prometheus(self, prom_path: str):
+        """
+        Writes the metrics in the Prometheus text exposition format, e.g. for the node_exporter
+        textfile collector. The file is replaced atomically so a scrape never sees half of it.
+
+        Args:
+            prom_path (str): Destination file, conventionally ending in '.prom'.
+        """
+        dataframe = self.to_dataframe()
+        summary = self.summary()
+        lines = [
+            f'# HELP {METRIC_PREFIX}_stage_seconds Latency of each crawl stage.',
+            f'# TYPE {METRIC_PREFIX}_stage_seconds summary',
+        ]
+        for stage, row in summary.iterrows():
+            seconds = dataframe.loc[dataframe["stage"] == stage, "elapsed_ms"] / 1000
+            for q in QUANTILES:
+                lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{stage}",quantile="{q}"}} {seconds.quantile(q):.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {seconds.sum():.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {int(row["count"])}')
+
+        for metric, column, help_text in [
+            ('stage_failures_total', 'failures', 'Stage executions that failed.'),
+            ('stage_retries_total', 'retries', 'Extra attempts made by a stage.'),
+            ('fetched_bytes_total', 'bytes', 'Bytes of HTML downloaded.'),
+        ]:
+            lines.append(f'# HELP {METRIC_PREFIX}_{metric} {help_text}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{metric} counter')
+            for stage, row in summary.iterrows():
+                lines.append(f'{METRIC_PREFIX}_{metric}{{stage="{stage}"}} {int(row[column])}')
+
+        lines.append(f'# HELP {METRIC_PREFIX}_last_run_timestamp_seconds When the run started.')
+        lines.append(f'# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge')
+        lines.append(f'{METRIC_PREFIX}_last_run_timestamp_seconds {self.started_at:.0f}')
+        _write_atomic(prom_path, '\n'.join(lines) + '\n')
+
+    def export(self, working_directory: str, name: str = 'crawl_telemetry'):
+        """
+        Writes <name>.prom, <name>.json and <name>.csv into the working directory.
+
+        Args:
+            working_directory (str): Destination directory.
+            name (str): Base file name, e.g. with a worker suffix.
+        """
+        self.write_prometheus(os.path.join(working_directory, f'{name}.prom'))
+        self.write_json_summary(os.path.join(working_directory, f'{name}.json'))
+        self.save(os.path.join(working_directory, f'{name}.csv'))
+
+
+def _write_atomic(path: str, text: str):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+crawl_telemetry = CrawlTelemetry()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# 沒有任何紀錄時（例如 worker 一條路線都沒領到）摘要與匯出也不能出錯
+from cycu11372010.page_wait import ReadinessLog
+from cycu11372010.telemetry import CrawlTelemetry
+
+
+def test_crawl_telemetry_summary_without_records():
+    summary = CrawlTelemetry().summary()
+
+    assert summary.empty
+    assert list(summary.columns) == ["count", "failures", "retries", "bytes", "total_ms",
+                                     "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+
+
+def test_crawl_telemetry_export_without_records(tmp_path):
+    CrawlTelemetry().export(str(tmp_path), name='worker')
+
+    for extension in ('prom', 'json', 'csv'):
+        assert (tmp_path / f'worker.{extension}').exists()
+
+
+def test_crawl_telemetry_summary_with_records():
+    telemetry = CrawlTelemetry()
+    telemetry.record('fetch_browser', 5.0, route_id='0161000900', nbytes=10)
+    telemetry.record('fetch_browser', 7.0, route_id='0161001500', ok=False)
+
+    row = telemetry.summary().loc['fetch_browser']
+    assert row['count'] == 2
+    assert row['failures'] == 1
+    assert row['bytes'] == 10
+    assert row['max_ms'] == 7.0
+
+
+def test_readiness_log_summary_without_records():
+    summary = ReadinessLog().summary()
+
+    assert summary.empty
+    assert list(summary.columns) == ["count", "median_ms", "p95_ms", "max_ms", "timeouts"]
@@ -2,6 +2,13 @@ import asyncio
 from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
 
+# 只需要站牌代碼，其他資源都擋掉；沒安裝 20250506 的套件 (pip install -e 20250506) 就不擋
+try:
+    from cycu11372010.request_filter import RequestFilter
+    REQUEST_FILTER = RequestFilter()
+except ImportError:
+    REQUEST_FILTER = None
+
 async def get_bus_info_go():
     route_id = input("請告訴我公車代碼: ").strip()
     url = f"https://ebus.gov.taipei/Route/StopsOfRoute?routeid={route_id}"
@@ -9,6 +16,8 @@ async def get_bus_info_go():
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
         page = await browser.new_page()
+        if REQUEST_FILTER is not None:
+            await REQUEST_FILTER.install_async(page)
         await page.goto(url)
 
         try:
@@ -2,11 +2,17 @@ import json
 import asyncio
 from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
+from cycu11372010.request_filter import RequestFilter
 
 # === 網頁 URL ===
 ROUTE_LIST_URL = "https://ebus.gov.taipei/Route"
 ROUTE_STOPS_URL = "https://ebus.gov.taipei/Route/StopsOfRoute?routeid={}"
 
+# === 擋掉用不到的資源 ===
+# 路線清單用非無頭模式觀察，保留樣式表；站牌頁只解析 HTML，全部擋掉
+ROUTE_LIST_FILTER = RequestFilter(blocked_resource_types=('image', 'font', 'media'))
+ROUTE_STOPS_FILTER = RequestFilter()
+
 # === 抓取所有路線代碼與名稱 ===
 async def fetch_all_routes():
     routes = {}
@@ -14,6 +20,7 @@ async def fetch_all_routes():
         # 改為非無頭模式 + 模擬操作延遲
         browser = await p.chromium.launch(headless=False, slow_mo=100)
         page = await browser.new_page()
+        await ROUTE_LIST_FILTER.install_async(page)
         await page.goto(ROUTE_LIST_URL)
 
         # 加入延遲等待 JS 載入
@@ -40,6 +47,7 @@ async def fetch_stops_for_route(route_id):
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)  # 保持 headless 抓資料快
         page = await browser.new_page()
+        await ROUTE_STOPS_FILTER.install_async(page)
         await page.goto(url)
         try:
             await page.wait_for_selector("div#GoDirectionRoute li", timeout=10000)
@@ -8,6 +8,7 @@ from selenium import webdriver
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 import time
 import threading
 from concurrent.futures import ThreadPoolExecutor
@@ -15,6 +16,9 @@ from tqdm import tqdm
 from data import *
 import os
 import sys
+import pandas as pd
+# 需先安裝 20250506 的套件: pip install -e 20250506
+from cycu11372010.arrival_decoder import bus_expected, decode_arrival_info
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 sys.stderr = open(os.devnull, "w")
@@ -27,11 +31,25 @@ service = Service(driver_path)
 driver = webdriver.Chrome(service=service, options=options)
 
 
+# 到站時間是網頁 JS 填進 position 欄位的，等到有文字才算載入完成（和套件的 READY_SELECTORS 同一個條件）
+def arrival_text_loaded(css_selector):
+    return lambda d: any(
+        (el.get_attribute("textContent") or "").strip()
+        for el in d.find_elements(By.CSS_SELECTOR, css_selector)
+    )
+
+
 # %% 取得所有公車路線
 def get_all_bus_line():
     # response = requests.get("https://ebus.gov.taipei/ebus", verify=False)
     response = driver.get("https://ebus.gov.taipei/ebus")
-    time.sleep(1)
+    # 等到路線清單出現就開始解析，最多等 10 秒；逾時就用目前載入的內容繼續
+    try:
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "section.busline li a"))
+        )
+    except TimeoutException:
+        pass
 
     soup = BeautifulSoup(driver.page_source, "html.parser")
     # print(soup.prettify())
@@ -67,7 +85,13 @@ def get_bus_line_detail(bus_line_name):
     bus_line_id = all_bus_line[bus_line_name]
     # https://ebus.gov.taipei/Route/StopsOfRoute?routeid=0100000A00
     driver.get(f"https://ebus.gov.taipei/Route/StopsOfRoute?routeid={bus_line_id}")
-    time.sleep(0.5)  # 等待頁面加載
+    # 等到去程的到站時間出現就開始解析，最多等 10 秒；逾時就用目前載入的內容繼續，不讓一條慢的路線中斷 search_fr_to
+    try:
+        WebDriverWait(driver, 10).until(
+            arrival_text_loaded("#GoDirectionRoute span.auto-list-stationlist-position")
+        )
+    except TimeoutException:
+        pass
     # print(driver.page_source)
     soup = BeautifulSoup(driver.page_source, "html.parser")
     """
@@ -128,10 +152,14 @@ def get_bus_line_detail(bus_line_name):
             EC.element_to_be_clickable((By.XPATH, '//a[contains(text(), "返程")]'))
         )
         link.click()
-        time.sleep(0.5)  # 等待頁面加載
     except Exception as e:
         all_bus_line_detail[bus_line_name] = [bus_stops_0, {}]
         return
+    # 等返程的到站時間出現；逾時就用目前載入的內容繼續
+    try:
+        wait.until(arrival_text_loaded("#BackDirectionRoute span.auto-list-stationlist-position"))
+    except TimeoutException:
+        pass
 
     soup = BeautifulSoup(driver.page_source, "html.parser")
     bus_stops_1 = {}
@@ -207,7 +235,7 @@ def search_fr_to():
         if fr + "_0" in stops[0] and to + "_0" in stops[0]:
             lines_to_search.append(bus_line_name)
 
-    res = []
+    candidates = []
 
     for line in tqdm(lines_to_search):
         get_bus_line_detail(line)
@@ -221,14 +249,18 @@ def search_fr_to():
                 if int(way[fr + direction]["stop_number"]) < int(
                     way[to + direction]["stop_number"]
                 ):
-                    if way[fr + direction]["stop_status"] not in [
-                        "尚未發車",
-                        "末班已過",
-                        "",
-                    ]:
-                        res.append(
-                            f"公車路線: {line_name}, 上車時間: {way[fr + direction]['stop_status']}"
-                        )
+                    candidates.append((line_name, way[fr + direction]["stop_status"]))
+
+    # 把到站文字一次解碼成秒數與狀態碼，只留有車會來的，並依到站時間排序
+    candidates = pd.DataFrame(candidates, columns=["line_name", "stop_status"])
+    decoded = decode_arrival_info(candidates["stop_status"])
+    candidates = candidates[bus_expected(decoded["arrival_status"])].assign(
+        eta_seconds=decoded["eta_seconds"]
+    ).sort_values("eta_seconds")
+    res = [
+        f"公車路線: {line_name}, 上車時間: {stop_status}"
+        for line_name, stop_status in zip(candidates["line_name"], candidates["stop_status"])
+    ]
     if not res:
         print("沒有找到符合條件的公車路線")
     for r in res: